@@ -0,0 +1,137 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import cv2
+import numpy
+
+from VideoRecorder.GestureDetection import DetectionDecoder, ModelInputPreparer, gestureClasses, readModelInputSize
+from VideoRecorder.InferenceBackends import createInferenceBackend, defaultModelPaths
+
+#Comparison of the inference backends, run from the root of the repository:
+#python -m Benchmarks.InferenceBackendBenchmark --video recording.mp4 --backend tensorflow --backend tflite:handGestModel/model_int8.tflite
+#Every backend runs in its own process, so the memory of one does not count for the other
+
+def readFrames(videoPath, frameCount, size):
+    #Frames from the video if it is given, random frames otherwise
+    if videoPath is None:
+        return [numpy.random.randint(0, 256, (size[1], size[0], 3), dtype=numpy.uint8) for _ in range(frameCount)]
+    frames = []
+    capture = cv2.VideoCapture(videoPath)
+    while len(frames) < frameCount:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+def getRSS():
+    import psutil
+    return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+
+def runBackend(backendName, modelPath, frames, threshold, warmup, resultQueue):
+    #Loading the backend, then measuring every call on the frames
+    rssBefore = getRSS()
+    startTime = time.perf_counter()
+    inputSize = readModelInputSize(os.path.join("handGestModel", "pipeline.config"))
+    backend = createInferenceBackend({"inferenceBackend": backendName, "inferenceModelPath": modelPath}, inputSize)
+    loadTime = time.perf_counter() - startTime
+    preparer = ModelInputPreparer(inputSize)
+    decoder = DetectionDecoder(gestureClasses, threshold)
+
+    for frame in frames[:warmup]:
+        backend.detect(preparer.prepare(frame))
+    latencies = []
+    detections = []
+    for frame in frames:
+        startTime = time.perf_counter()
+        boxes, classIds, scores = backend.detect(preparer.prepare(frame))
+        latencies.append((time.perf_counter() - startTime) * 1000)
+        decoded = decoder.decode(boxes, classIds, scores, (frame.shape[1], frame.shape[0]))
+        detections.append(decoded[0] if decoded else None)
+
+    resultQueue.put({"backend": backendName, "modelPath": modelPath, "loadSeconds": loadTime,
+                     "rssMB": getRSS(), "rssIncreaseMB": getRSS() - rssBefore,
+                     "latencies": latencies, "detections": detections})
+
+def boxIoU(first, second):
+    yMin, xMin = max(first[0], second[0]), max(first[1], second[1])
+    yMax, xMax = min(first[2], second[2]), min(first[3], second[3])
+    intersection = max(0, yMax - yMin) * max(0, xMax - xMin)
+    union = (first[2] - first[0]) * (first[3] - first[1]) + (second[2] - second[0]) * (second[3] - second[1]) - intersection
+    return intersection / union if union > 0 else 0
+
+def agreement(reference, detections, minimumIoU):
+    #A frame agrees if neither found a gesture, or both found the same gesture at nearly the same place
+    agreeing = 0
+    for referenceDetection, detection in zip(reference, detections):
+        if referenceDetection is None or detection is None:
+            agreeing += referenceDetection is None and detection is None
+        elif referenceDetection[0] == detection[0] and boxIoU(referenceDetection[2], detection[2]) >= minimumIoU:
+            agreeing += 1
+    return agreeing / max(len(reference), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, memory and detection agreement of the inference backends")
+    parser.add_argument("--backend", action="append", help="name or name:modelPath, the first one is the reference")
+    parser.add_argument("--video", help="Video file to take the frames from, random frames are used otherwise")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", default="640x480", help="Size of the random frames")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--json", help="Save the results to this file")
+    args = parser.parse_args()
+
+    backends = []
+    for backend in args.backend or defaultModelPaths.keys():
+        name, _, modelPath = backend.partition(":")
+        modelPath = modelPath or defaultModelPaths[name]
+        if not os.path.exists(modelPath):
+            print("Skipping", name, "missing model", modelPath)
+            continue
+        backends.append((name, modelPath))
+
+    size = tuple(int(value) for value in args.size.split("x"))
+    frames = readFrames(args.video, args.frames, size)
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name, modelPath in backends:
+        resultQueue = context.Queue()
+        process = context.Process(target=runBackend, args=(name, modelPath, frames, args.threshold, args.warmup, resultQueue))
+        process.start()
+        #Waiting for the result, unless the backend could not be loaded and the process died
+        while True:
+            try:
+                results.append(resultQueue.get(timeout=1))
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    print("Backend", name, "failed")
+                    break
+        process.join()
+
+    print("backend     model                                   load s   RSS MB  mean ms  p95 ms  agreement")
+    summary = []
+    if not results:
+        return
+    for result in results:
+        latencies = numpy.array(result["latencies"])
+        resultAgreement = agreement(results[0]["detections"], result["detections"], args.iou)
+        summary.append({"backend": result["backend"], "modelPath": result["modelPath"], "loadSeconds": result["loadSeconds"],
+                        "rssMB": result["rssMB"], "rssIncreaseMB": result["rssIncreaseMB"],
+                        "meanMs": float(latencies.mean()), "medianMs": float(numpy.median(latencies)),
+                        "p95Ms": float(numpy.percentile(latencies, 95)), "agreement": resultAgreement})
+        print("%-11s %-39s %6.2f  %7.1f  %7.2f  %6.2f  %8.1f%%" % (result["backend"], result["modelPath"], result["loadSeconds"],
+                                                                  result["rssMB"], latencies.mean(), numpy.percentile(latencies, 95),
+                                                                  resultAgreement * 100))
+    if args.json:
+        with open(args.json, "w") as outputFile:
+            json.dump(summary, outputFile, indent=2)
+
+if __name__ == '__main__':
+    main()
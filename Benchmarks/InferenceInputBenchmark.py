@@ -0,0 +1,50 @@
+import argparse
+import os
+import time
+
+import numpy
+import tensorflow as tf
+
+from VideoRecorder.GestureDetection import ModelInputPreparer, readModelInputSize
+
+#Benchmark of the model input preparation, run from the root of the repository:
+#python -m Benchmarks.InferenceInputBenchmark
+
+def measure(function, frame, iterations, warmup):
+    #Returns the per call latencies in milliseconds, after a few calls to warm up the graph
+    for _ in range(warmup):
+        function(frame)
+    latencies = []
+    for _ in range(iterations):
+        startTime = time.perf_counter()
+        function(frame)
+        latencies.append((time.perf_counter() - startTime) * 1000)
+    return numpy.array(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per call latency of the gesture model with full frames and with pre-resized frames")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args()
+
+    model = tf.saved_model.load(os.path.join("handGestModel", "saved_model"))
+    inputSize = readModelInputSize(os.path.join("handGestModel", "pipeline.config"))
+    preparer = ModelInputPreparer(inputSize)
+    detectFunction = tf.function(model.__call__, input_signature=[tf.TensorSpec([1, inputSize[1], inputSize[0], 3], tf.uint8)])
+
+    #The old path sends the full frame to the model, the new one resizes it first and uses the fixed signature
+    paths = {
+        "full frame": lambda frame: model(numpy.expand_dims(frame, 0)),
+        "pre-resized": lambda frame: detectFunction(preparer.prepare(frame)),
+    }
+
+    print("resolution  path          mean ms  median ms  p95 ms")
+    for width, height in [(640, 480), (1280, 720)]:
+        frame = numpy.random.randint(0, 256, (height, width, 3), dtype=numpy.uint8)
+        for name, function in paths.items():
+            latencies = measure(function, frame, args.iterations, args.warmup)
+            print("%-11s %-13s %7.2f  %9.2f  %6.2f" % (str(width) + "x" + str(height), name, latencies.mean(),
+                                                      numpy.median(latencies), numpy.percentile(latencies, 95)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import subprocess
+import tempfile
+import time
+
+import numpy
+
+#End to end benchmark of the recorder without a camera or a microphone, run from the root of the repository:
+#python -m Benchmarks.PipelineBenchmark --size 640x480 --size 1280x720 --ai both --json results.json
+#The frames are generated (or read from --video) as fast as the recorder takes them, the audio is a generated tone
+#Every configuration runs in its own process, so the memory and the loaded model of one does not count for the other
+
+def getCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except OSError:
+        return ""
+
+def runConfiguration(settings, useAI, frameCount, warmup, resultQueue):
+    import psutil
+    from VideoRecorder.Recorder import Recorder
+
+    process = psutil.Process(os.getpid())
+    recorder = Recorder(settings)
+    if useAI:
+        #The model is loaded before the measurement, the loading time is reported separately
+        recorder.loadModel()
+        recorder.modelLoader.wait()
+        if not recorder.modelLoader.isReady():
+            resultQueue.put({"error": "The model could not be loaded: " + str(recorder.modelLoader.error)})
+            return
+    returnValue = recorder.startRecorder()
+    if returnValue != 0:
+        resultQueue.put({"error": "The recorder could not be started: " + str(returnValue)})
+        return
+
+    for _ in range(warmup):
+        recorder.getCurrentFrame(useAI)
+
+    latencies = []
+    peakRSS = process.memory_info().rss
+    firstWritten = recorder.profiler.summary()["stages"].get("encode", {}).get("count", 0)
+    cpuBefore = process.cpu_times()
+    startTime = time.perf_counter()
+    for index in range(frameCount):
+        callTime = time.perf_counter()
+        recorder.getCurrentFrame(useAI)
+        latencies.append((time.perf_counter() - callTime) * 1000)
+        if index % 30 == 0:
+            peakRSS = max(peakRSS, process.memory_info().rss)
+    duration = time.perf_counter() - startTime
+    cpuAfter = process.cpu_times()
+    #In the pipeline mode the calls only return the preview, so the fps is counted from the written frames
+    stageSummary = recorder.profiler.summary()
+    writtenFrames = stageSummary["stages"].get("encode", {}).get("count", 0) - firstWritten
+
+    stopTime = time.perf_counter()
+    recorder.stopRecorder()
+    stopDuration = time.perf_counter() - stopTime
+
+    latencies = numpy.array(latencies)
+    cpuSeconds = (cpuAfter.user - cpuBefore.user) + (cpuAfter.system - cpuBefore.system)
+    resultQueue.put({
+        "fps": writtenFrames / duration,
+        "callMeanMs": float(latencies.mean()),
+        "callP50Ms": float(numpy.percentile(latencies, 50)),
+        "callP95Ms": float(numpy.percentile(latencies, 95)),
+        "callP99Ms": float(numpy.percentile(latencies, 99)),
+        "cpuPercent": cpuSeconds / duration * 100,
+        "peakRssMB": peakRSS / (1024 * 1024),
+        "stopSeconds": stopDuration,
+        "modelLoad": recorder.getModelStatus()["timings"] if useAI else None,
+        "stages": {name: {key: value for key, value in stats.items() if key != "histogram"} for name, stats in stageSummary["stages"].items()},
+        "counters": stageSummary["counters"],
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame rate, call latency, CPU and memory of the recorder on generated input")
+    parser.add_argument("--size", action="append", help="Frame size as WIDTHxHEIGHT, can be given more times")
+    parser.add_argument("--ai", choices=["off", "on", "both"], default="both")
+    parser.add_argument("--video", help="Video file to replay instead of the generated frames")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--fps", type=float, default=30, help="Nominal frame rate of the generated frames")
+    parser.add_argument("--paced", action="store_true", help="Deliver the frames at the nominal rate, like a camera")
+    parser.add_argument("--pipeline", action="store_true", help="Use the pipelined recorder")
+    parser.add_argument("--settings", default=os.path.join("Configs", "settings.json"))
+    parser.add_argument("--json", help="Save the results to this file")
+    args = parser.parse_args()
+
+    with open(args.settings) as settingsFile:
+        baseSettings = json.load(settingsFile)
+    sizes = [tuple(int(value) for value in size.split("x")) for size in (args.size or ["640x480"])]
+    aiModes = {"off": [False], "on": [True], "both": [False, True]}[args.ai]
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as savePath:
+        for size in sizes if args.video is None else [None]:
+            for useAI in aiModes:
+                settings = dict(baseSettings, savePath=savePath, pipelineMode=args.pipeline, instrumentation=True,
+                                instrumentationPath=savePath, audioSource="tone", syntheticRealtime=args.paced,
+                                motionGateEnabled=False)
+                if args.video is None:
+                    settings.update(videoSource="synthetic", syntheticVideoSize=list(size), syntheticVideoFps=args.fps)
+                else:
+                    settings.update(videoSource="file", videoSourcePath=args.video)
+                configuration = {"size": "video" if size is None else "%dx%d" % size, "ai": useAI, "pipeline": args.pipeline, "paced": args.paced}
+
+                resultQueue = context.Queue()
+                process = context.Process(target=runConfiguration, args=(settings, useAI, args.frames, args.warmup, resultQueue))
+                process.start()
+                #Waiting for the result, unless the process died
+                result = None
+                while result is None:
+                    try:
+                        result = resultQueue.get(timeout=1)
+                    except queue.Empty:
+                        if not process.is_alive():
+                            result = {"error": "The benchmark process died"}
+                process.join()
+                results.append(dict(configuration, **result))
+
+    print("size        ai   fps     mean ms  p95 ms  CPU %   RSS MB")
+    for result in results:
+        if "error" in result:
+            print("%-11s %-4s %s" % (result["size"], "on" if result["ai"] else "off", result["error"]))
+            continue
+        print("%-11s %-4s %6.1f  %7.2f  %6.2f  %6.1f  %7.1f" % (result["size"], "on" if result["ai"] else "off", result["fps"],
+                                                                 result["callMeanMs"], result["callP95Ms"],
+                                                                 result["cpuPercent"], result["peakRssMB"]))
+    if args.json:
+        output = {"commit": getCommit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpuCount": os.cpu_count(),
+                              "python": platform.python_version()},
+                  "frames": args.frames, "results": results}
+        with open(args.json, "w") as outputFile:
+            json.dump(output, outputFile, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+
+import cv2
+import numpy
+
+from VideoRecorder.GestureDetection import DetectionDecoder, ModelInputPreparer, gestureClasses, readModelInputSize
+from VideoRecorder.InferenceBackends import createInferenceBackend
+
+#Offline gesture annotation of existing recordings, run from the root of the repository:
+#python -m Tools.AnnotateRecordings Recording-1.mp4 Recording-2.mp4 --workers 8
+#Every recording gets a sidecar file next to it with one row per detection: frame, time, class, score and box
+
+#The model of the worker process, loaded once by the initializer
+workerState = {}
+
+def initializeWorker(settings, threshold):
+    inputSize = readModelInputSize(os.path.join("handGestModel", "pipeline.config"))
+    workerState["backend"] = createInferenceBackend(settings, inputSize)
+    workerState["preparer"] = ModelInputPreparer(inputSize)
+    workerState["decoder"] = DetectionDecoder(gestureClasses, threshold)
+
+def annotateChunk(path, startFrame, endFrame, frameStep, topK):
+    #Decoding the frames of the chunk and running the model on every frameStep-th of them
+    backend = workerState["backend"]
+    preparer = workerState["preparer"]
+    decoder = workerState["decoder"]
+    rows = []
+    capture = cv2.VideoCapture(path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, startFrame)
+    for frameIndex in range(startFrame, endFrame):
+        #Skipped frames are only grabbed, not decoded
+        if frameIndex % frameStep != 0:
+            if not capture.grab():
+                break
+            continue
+        ret, frame = capture.read()
+        if not ret:
+            break
+        boxes, classIds, scores = backend.detect(preparer.prepare(frame))
+        for name, score, box in decoder.decode(boxes, classIds, scores, (frame.shape[1], frame.shape[0]), topK):
+            rows.append((frameIndex, name, score, box))
+    capture.release()
+    return path, rows
+
+def writeSidecar(path, rows, frameRate):
+    #Columnar sidecar file, parquet if pyarrow is installed, a compressed numpy archive otherwise
+    rows.sort(key=lambda row: row[0])
+    frames = numpy.array([row[0] for row in rows], dtype=numpy.int32)
+    columns = {
+        "frame": frames,
+        "time": frames / frameRate if frameRate > 0 else numpy.zeros(len(frames)),
+        "class": numpy.array([row[1] or "" for row in rows], dtype=str),
+        "score": numpy.array([row[2] for row in rows], dtype=numpy.float32),
+    }
+    boxes = numpy.array([row[3] for row in rows], dtype=numpy.int32).reshape(-1, 4)
+    for i, name in enumerate(["yMin", "xMin", "yMax", "xMax"]):
+        columns[name] = boxes[:, i]
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        sidecarPath = os.path.splitext(path)[0] + ".gestures.npz"
+        numpy.savez_compressed(sidecarPath, **columns)
+        return sidecarPath
+    sidecarPath = os.path.splitext(path)[0] + ".gestures.parquet"
+    table = pyarrow.table({name: column.tolist() if name == "class" else column for name, column in columns.items()})
+    pyarrow.parquet.write_table(table, sidecarPath, compression="zstd")
+    return sidecarPath
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotate existing recordings with the gestures found by the model")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-frames", type=int, default=300, help="Number of frames decoded by one task")
+    parser.add_argument("--frame-step", type=int, default=1, help="Run the model on every n-th frame")
+    parser.add_argument("--top-k", type=int, default=1, help="Number of detections kept per frame")
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--backend", default="tensorflow")
+    parser.add_argument("--model-path", default="")
+    args = parser.parse_args()
+
+    #Every process gets a single thread for the model, the parallelism comes from the number of processes
+    settings = {"inferenceBackend": args.backend, "inferenceModelPath": args.model_path, "inferenceThreads": 1}
+
+    #Splitting every recording into chunks of frames
+    tasks = []
+    frameRates = {}
+    for path in args.videos:
+        capture = cv2.VideoCapture(path)
+        frameCount = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        frameRates[path] = capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+        if frameCount <= 0:
+            print("Could not read", path)
+            continue
+        for startFrame in range(0, frameCount, args.chunk_frames):
+            tasks.append((path, startFrame, min(startFrame + args.chunk_frames, frameCount)))
+
+    #TensorFlow does not support forking, so the workers are started fresh
+    results = {path: [] for path in frameRates}
+    remainingChunks = {path: sum(1 for task in tasks if task[0] == path) for path in frameRates}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=initializeWorker, initargs=(settings, args.threshold)) as executor:
+        futures = [executor.submit(annotateChunk, path, startFrame, endFrame, args.frame_step, args.top_k)
+                   for path, startFrame, endFrame in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            path, rows = future.result()
+            results[path].extend(rows)
+            remainingChunks[path] -= 1
+            #Writing the sidecar as soon as every chunk of the recording is done
+            if remainingChunks[path] == 0:
+                sidecarPath = writeSidecar(path, results.pop(path), frameRates[path])
+                print("Annotated", path, "->", sidecarPath)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
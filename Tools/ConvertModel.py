@@ -0,0 +1,90 @@
+import argparse
+import glob
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy
+
+from VideoRecorder.GestureDetection import ModelInputPreparer, readModelInputSize
+from VideoRecorder.InferenceBackends import createNormalizationTable
+
+#Conversion of the gesture model for the tflite and onnx inference backends, run from the root of the repository:
+#python -m Tools.ConvertModel tflite --int8 --images path/to/frames --output handGestModel/model_int8.tflite
+#python -m Tools.ConvertModel onnx --output handGestModel/model.onnx
+#For tflite the saved model should be exported with export_tflite_graph_tf2.py of the object detection API,
+#so it contains the tflite detection postprocess operation instead of the TensorFlow one
+
+def readRepresentativeFrames(imageDirectory, videoPath, samples):
+    #Frames for the int8 calibration, either images from a directory or evenly spaced frames from a video
+    frames = []
+    if imageDirectory:
+        for path in sorted(glob.glob(os.path.join(imageDirectory, "*")))[:samples]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+    if videoPath:
+        capture = cv2.VideoCapture(videoPath)
+        frameCount = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        for index in numpy.linspace(0, max(frameCount - 1, 0), samples).astype(int):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ret, frame = capture.read()
+            if ret:
+                frames.append(frame)
+        capture.release()
+    return frames
+
+def convertTFLite(args):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(args.saved_model)
+    converter.allow_custom_ops = True
+    if args.int8:
+        frames = readRepresentativeFrames(args.images, args.video, args.samples)
+        if not frames:
+            print("No representative frames found, give --images or --video for the int8 conversion")
+            return 1
+        preparer = ModelInputPreparer(readModelInputSize(args.pipeline_config))
+        table = createNormalizationTable()
+
+        def representativeDataset():
+            #The same preprocessing as the tflite backend, with float input
+            for frame in frames:
+                yield [numpy.take(table, preparer.prepare(frame))]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representativeDataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+        converter.inference_input_type = tf.uint8
+
+    with open(args.output, "wb") as outputFile:
+        outputFile.write(converter.convert())
+    print("Saved tflite model to", args.output)
+    return 0
+
+def convertONNX(args):
+    #tf2onnx keeps the output names of the saved model, which the onnx backend relies on
+    command = [sys.executable, "-m", "tf2onnx.convert", "--saved-model", args.saved_model,
+               "--output", args.output, "--opset", str(args.opset)]
+    return subprocess.run(command).returncode
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the gesture model for the tflite and onnx inference backends")
+    parser.add_argument("format", choices=["tflite", "onnx"])
+    parser.add_argument("--saved-model", default=os.path.join("handGestModel", "saved_model"))
+    parser.add_argument("--pipeline-config", default=os.path.join("handGestModel", "pipeline.config"))
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--int8", action="store_true", help="Quantize the tflite model to int8 with a representative dataset")
+    parser.add_argument("--images", help="Directory of representative images for the int8 conversion")
+    parser.add_argument("--video", help="Video file of representative frames for the int8 conversion")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    if args.format == "tflite":
+        return convertTFLite(args)
+    return convertONNX(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+
+from VideoRecorder.Recorder import Recorder
+from VideoRecorder.SessionArchive import SessionArchive, compareChecksums
+
+#Replaying a session archive through the recorder, run from the root of the repository:
+#python -m Tools.ReplaySession Session-18-10-2026_10-00-00 --save-checksums baseline.npz
+#python -m Tools.ReplaySession Session-18-10-2026_10-00-00 --baseline baseline.npz --json report.json
+#The archive is saved by a recording with the sessionCapture setting turned on
+#By default the recorded model outputs are used, so the replay only depends on the recorder and not on the speed of the model
+#The input of the archive is compressed, so the output frames are compared to an earlier replay and not to the original session
+#The exit code is 1 if output frames differ from the baseline, 2 if the replay cannot start and 3 if saving the replayed recording fails
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured session through the recorder and compare the output frames")
+    parser.add_argument("session", help="Folder of the session archive")
+    parser.add_argument("--paced", action="store_true", help="Replay at the recorded capture times instead of as fast as possible")
+    parser.add_argument("--pipeline", action="store_true", help="Use the pipelined recorder")
+    parser.add_argument("--live-model", action="store_true", help="Run the model instead of using the recorded outputs")
+    parser.add_argument("--settings", default=os.path.join("Configs", "settings.json"))
+    parser.add_argument("--output", help="Folder of the replayed recording, a temporary folder is used otherwise")
+    parser.add_argument("--baseline", help="Checksums of an earlier replay to compare the output frames with")
+    parser.add_argument("--save-checksums", help="Save the checksums of the output frames to this file")
+    parser.add_argument("--json", help="Save the report to this file")
+    args = parser.parse_args()
+
+    with open(args.settings) as settingsFile:
+        settings = json.load(settingsFile)
+    archive = SessionArchive(args.session)
+    #The settings of the recorded session decide what the recorder does, only the inputs and the outputs are changed
+    settings.update(archive.metadata["settings"])
+
+    with tempfile.TemporaryDirectory() as temporaryPath:
+        savePath = args.output or temporaryPath
+        settings.update(savePath=savePath, sessionCapture=False, sessionReplayPath=args.session, replayPaced=args.paced,
+                        replayInference="live" if args.live_model else "recorded", pipelineMode=args.pipeline,
+                        instrumentation=True, instrumentationPath=savePath)
+        recorder = Recorder(settings)
+        if args.live_model:
+            recorder.loadModel()
+            recorder.modelLoader.wait()
+        returnValue = recorder.startRecorder()
+        if returnValue != 0:
+            print("The replay could not be started, error", returnValue)
+            sys.exit(2)
+
+        replay = recorder.sessionReplay
+        commands = []
+        startTime = time.perf_counter()
+        while not replay.isFinished():
+            _, command = recorder.getCurrentFrame(replay.videoSource.nextUseAI())
+            if command == "ReadError":
+                print("The replay stopped with a read error")
+                break
+            if command is not None:
+                commands.append(command)
+        duration = time.perf_counter() - startTime
+        stageSummary = recorder.profiler.summary()
+        finalizationJob = recorder.stopRecorder()
+        #The pipeline handles the last frames after the replay finished, their commands are still in the queue
+        if args.pipeline:
+            while not recorder.commandQueue.empty():
+                commands.append(recorder.commandQueue.get_nowait())
+
+    outputTimestamps = numpy.frombuffer(replay.outputTimestamps, dtype=numpy.float64)
+    outputChecksums = numpy.frombuffer(replay.outputChecksums, dtype=numpy.int64)
+    recordedCommands = [command["command"] for command in archive.metadata["commands"]]
+    recordedDuration = float(archive.frameTimestamps[-1] - archive.frameTimestamps[0]) if len(archive.frameTimestamps) > 1 else 0.0
+    report = {
+        "session": args.session,
+        "frames": int(replay.videoSource.frameIndex),
+        "outputFrames": len(outputChecksums),
+        "seconds": duration,
+        "fps": replay.videoSource.frameIndex / duration if duration > 0 else 0.0,
+        "speed": recordedDuration / duration if duration > 0 else 0.0,
+        "commands": commands,
+        "commandsMatch": commands == recordedCommands,
+        "stages": {name: {key: value for key, value in stats.items() if key != "histogram"} for name, stats in stageSummary["stages"].items()},
+        "counters": stageSummary["counters"],
+        "syncReport": recorder.syncReport,
+        "finalization": finalizationJob.status(),
+    }
+
+    if args.save_checksums:
+        numpy.savez_compressed(args.save_checksums, outputTimestamps=outputTimestamps, outputChecksums=outputChecksums)
+    if args.baseline:
+        baseline = numpy.load(args.baseline)
+        mismatches = compareChecksums(outputTimestamps, outputChecksums, baseline["outputTimestamps"], baseline["outputChecksums"])
+        report["mismatchedFrames"] = len(mismatches)
+        report["firstMismatches"] = mismatches[:20]
+
+    print("Replayed %d frames in %.2f s (%.1f fps, %.1fx real time)" % (report["frames"], duration, report["fps"], report["speed"]))
+    print("Commands:", commands, "match the recording" if report["commandsMatch"] else "differ from the recording " + str(recordedCommands))
+    if args.baseline:
+        print("Output frames differing from the baseline:", report["mismatchedFrames"])
+    if args.json:
+        with open(args.json, "w") as outputFile:
+            json.dump(report, outputFile, indent=2)
+    if finalizationJob.state == "failed":
+        print("Finalizing the replay failed:", finalizationJob.status()["error"] or "see the ffmpeg output above")
+    if report.get("mismatchedFrames"):
+        sys.exit(1)
+    if finalizationJob.state == "failed":
+        sys.exit(3)
+
+if __name__ == '__main__':
+    main()
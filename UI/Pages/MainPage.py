@@ -6,15 +6,19 @@ import json
 
 from UI.Recorder.UIRecorder import UIRecorder
 from VideoRecorder.Recorder import Recorder
+from VideoRecorder.FinalizationQueue import FinalizationQueue
 
 class MainPage(QWidget):
     #Signal object, so we can communicate with the holding UIApp class that a screen change is needed
     #Using this allows easier screen addition since they can be added in more sperate blocks
     switchSignal = pyqtSignal(int)
+    #Sent from the finalizer threads with the job, whenever it moves on to a new step or finishes
+    finalizationSignal = pyqtSignal(object)
 
     def __init__(self, left, top, width, height):
         super().__init__()
         self.recorder = None
+        self.finalizationQueue = None
 
         #Import setting from settings.json
         self.reloadSetting()
@@ -27,6 +31,10 @@ class MainPage(QWidget):
         
         self.recorder = Recorder(self.settings)
         self.uiRecorder = None
+        #The stopped recordings are saved in the background, so the next one can be started immediately
+        self.finalizationQueue = FinalizationQueue(self.settings.get("finalizationWorkers", 1))
+        self.finalizationQueue.addListener(self.finalizationSignal.emit)
+        self.finalizationSignal.connect(self.updateFinalizationStatus)
         self.videoSizes = [(320,240), (640, 480), (960, 720)]
 
         self.maxVolume = 100
@@ -43,6 +51,8 @@ class MainPage(QWidget):
         self.settings = json.load(fileHandler)
         if self.recorder is not None:
             self.recorder.setSettings(self.settings)
+        if self.finalizationQueue is not None:
+            self.finalizationQueue.maxWorkers = max(int(self.settings.get("finalizationWorkers", 1)), 1)
 
     def getCurrentVideoGeometry(self, width):
         currentIndex = 0
@@ -52,17 +62,30 @@ class MainPage(QWidget):
             else: break
         return self.videoSizes[currentIndex]
 
-    @pyqtSlot(QImage)
-    def setImage(self, image, manual=False):
-        if self.uiRecorder is None and not manual:
+    @pyqtSlot()
+    def showPreview(self):
+        #Taking the newest preview of the uiRecorder, the frames are already downscaled to the preview size
+        if self.uiRecorder is None:
             return
-        
+        preview = self.uiRecorder.takePreview()
+        if preview is None:
+            return
+        image, buffer = preview
+        self.livePicture.setPixmap(QPixmap.fromImage(image))
+
+    def setImage(self, image):
+        #Showing a static image, scaled to the size of the preview
         currentWidth = self.size().width()
         currentGeometry = self.getCurrentVideoGeometry(currentWidth)
-
         rescaledImage = image.scaled(currentGeometry[0], currentGeometry[1], Qt.KeepAspectRatio)
         self.livePicture.setPixmap(QPixmap.fromImage(rescaledImage))
 
+    def resizeEvent(self, event):
+        #Letting the uiRecorder know the new size of the preview
+        super().resizeEvent(event)
+        if self.uiRecorder is not None:
+            self.uiRecorder.setPreviewSize(self.getCurrentVideoGeometry(self.size().width()))
+
     @pyqtSlot(int)
     def setAudioLevel(self, levelChange):
         #A bug calls the emit signal twice, so every second gesture has to be skipped        
@@ -93,6 +116,32 @@ class MainPage(QWidget):
         elif returnValue == 4:
                 self.stopRecorderUtil("Video or Audio input error!")
 
+    @pyqtSlot(object)
+    def updateFinalizationStatus(self, job):
+        #Showing the progress of the oldest recording which is being saved, or the result of the finished one
+        activeJobs = self.finalizationQueue.activeJobs()
+        if activeJobs:
+            current = activeJobs[0]
+            self.finalizationLabel.setText("Saving " + str(len(activeJobs)) + " recording(s), " + current.name + ": " +
+                                           (current.currentStep or "waiting") + " (" + str(int(current.progress * 100)) + "%)")
+        elif job.state == "failed":
+            self.finalizationLabel.setText("Saving " + job.name + " failed, the recorded files are kept!")
+        else:
+            self.finalizationLabel.setText("Saved " + job.name)
+            QTimer.singleShot(5000, self.clearFinalizationStatus)
+
+    def clearFinalizationStatus(self):
+        if not self.finalizationQueue.activeJobs():
+            self.finalizationLabel.setText("")
+
+    def finishRecordings(self):
+        #Called when the application is closed, the recording is stopped and every recording is saved before exiting
+        if self.uiRecorder is not None:
+            self.stopRecorder()
+        if self.finalizationQueue.activeJobs():
+            print("Waiting for the recordings to be saved")
+        self.finalizationQueue.wait()
+
     def emitSwitchSignal(self):
         #Couldn't make lambda functions work, so using a normal one
         if self.uiRecorder is not None:
@@ -106,6 +155,21 @@ class MainPage(QWidget):
         if self.uiRecorder is not None:
             self.uiRecorder.switchAISupport(checkBox != 0)
 
+        #The model is loaded in the background the first time the AI is turned on, the progress is shown on the checkbox
+        if checkBox != 0:
+            self.recorder.loadModel()
+            self.updateModelStatus()
+
+    def updateModelStatus(self):
+        status = self.recorder.getModelStatus()
+        if status["state"] == "ready":
+            self.aiSupport.setText("AI Support")
+        elif status["state"] == "failed":
+            self.aiSupport.setText("AI Support (model failed to load)")
+        else:
+            self.aiSupport.setText("AI Support (loading " + str(int(status["progress"] * 100)) + "%)")
+            QTimer.singleShot(250, self.updateModelStatus)
+
     def takeScreenshot(self):
         #Calling the take screenshot method from the recorder and checking if it was succesfull
         if self.uiRecorder is None:
@@ -135,35 +199,35 @@ class MainPage(QWidget):
         QTimer.singleShot(2000, lambda : self.messageLabel.setText(""))
 
         self.uiRecorder = UIRecorder(0, self.recorder)
-        self.uiRecorder.changePixmap.connect(self.setImage)
+        self.uiRecorder.previewReady.connect(self.showPreview)
         self.uiRecorder.soundChangeSignal.connect(self.setAudioLevel)
         self.uiRecorder.errorSignal.connect(self.errorHandling)
         self.uiRecorder.switchAISupport(self.aiSupport.isChecked())
+        self.uiRecorder.setPreviewSize(self.getCurrentVideoGeometry(self.size().width()))
         self.uiRecorder.start()
 
-    def stopRecorderUtil(self, text = "Recording is stopping, the video save might take a few moments, dont turn off!"):
-        #In order for qt to load the message before waiting for ht uiRecorder to finish a small delay is inserted
+    def stopRecorderUtil(self, text = "Recording stopped, it is saved in the background!"):
+        #Stopping only releases the devices, the saving of the video is shown under the buttons
         if self.uiRecorder is None:
             return
         self.messageLabel.setText(text)
-        QTimer.singleShot(1000, lambda : self.stopRecorder())
+        self.stopRecorder()
 
     def stopRecorder(self):
         #Check if the uiRecorder has already been stopped
         QTimer.singleShot(5000, lambda : self.messageLabel.setText(""))
 
         #Stopping the Recorder        
-        self.uiRecorder.changePixmap.disconnect(self.setImage)
+        self.uiRecorder.previewReady.disconnect(self.showPreview)
         self.uiRecorder.soundChangeSignal.disconnect(self.setAudioLevel)
         self.uiRecorder.errorSignal.disconnect(self.errorHandling)
-        self.uiRecorder.stop()
-        self.uiRecorder.wait()
+        self.uiRecorder.stop(self.finalizationQueue)
         self.uiRecorder = None
 
         #Setting the video feed back to a black image
         blackImage = QImage()
         blackImage.load("Presets/Black.png")
-        self.setImage(blackImage, manual=True)
+        self.setImage(blackImage)
 
     def initUI(self):
         #Initializing the ui elements and their positions
@@ -230,6 +294,7 @@ class MainPage(QWidget):
         # Create utility and navigation and functional buttons and labels
         self.messageLabel = QLabel(self)
         # self.messageLabel.resize(160, 50)
+        self.finalizationLabel = QLabel(self)
         self.settingsBtn = QPushButton("Settings")
         self.settingsBtn.clicked.connect(self.emitSwitchSignal)
         self.settingsBtn.setStyleSheet(buttonStyleSheet)
@@ -280,6 +345,7 @@ class MainPage(QWidget):
         self.mainLayout.addWidget(self.stopBtn, 3, 3, Qt.AlignCenter)
         self.mainLayout.addWidget(self.screenshotBtn, 3, 4, Qt.AlignCenter)
         self.mainLayout.addWidget(self.aiSupport, 3, 5, Qt.AlignCenter)
+        self.mainLayout.addWidget(self.finalizationLabel, 4, 0, 1, 0, Qt.AlignCenter)
 
         #Finalizing the layout of the main screen
         self.setLayout(self.mainLayout)
@@ -287,4 +353,4 @@ class MainPage(QWidget):
         # Show black picture where the video should be
         blackImage = QImage()
         blackImage.load("Presets/Black.png")
-        self.setImage(blackImage, manual=True)
\ No newline at end of file
+        self.setImage(blackImage)
\ No newline at end of file
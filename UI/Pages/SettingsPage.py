@@ -2,16 +2,18 @@ from PyQt5.QtWidgets import  QWidget, QGridLayout, QPushButton, QLineEdit, QLabe
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QCursor
 
-import cv2
-import pyaudio
 import json
 import tkinter
 from tkinter import filedialog
 
+from VideoRecorder.DeviceRegistry import DeviceRegistry
+
 class SettingsPage(QWidget):
     #Signal object, so we can communicate with the holding UIApp class that a screen change is needed
     #Using this allows easier screen addition since they can be added in more sperate blocks
     switchSignal = pyqtSignal(int)
+    #Emitted from the thread of the device registry when the list of devices changed
+    devicesChanged = pyqtSignal()
     initialized = False
 
     def __init__(self, left, top, width, height):
@@ -23,44 +25,19 @@ class SettingsPage(QWidget):
         self.width = width
         self.height = height
 
+        #The devices are probed in the background when the application starts, the page only shows the cached lists
+        self.deviceRegistry = DeviceRegistry()
+        self.deviceRegistry.addListener(self.devicesChanged.emit)
+        self.deviceRegistry.start()
+
         #Import setting from settings.json
         self.reloadSetting()
 
         #Initialize the ui elements
         self.initUI()
         self.initialized = True
-
-    def getAudioDeviceList(self):
-        #Get the list of audio devices for option to swap them
-        p = pyaudio.PyAudio()
-        info = p.get_host_api_info_by_index(0)
-        deviceNumber = info.get('deviceCount')
-        returnArray = []
-
-        for i in range(deviceNumber):
-            if (p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels')) > 0:
-                returnArray.append((i, p.get_device_info_by_host_api_device_index(0, i).get('name')))
-
-        p.terminate()
-        return returnArray
-
-    def getVideoDeviceList(self):
-        #Since there is no built-in method to acquire the list of video capture devices, I loop through them until I get an error, meaning no available device
-        index = 0
-        returnArray = []
-        while True:
-            device = cv2.VideoCapture(index)
-            try:
-                device.getBackendName()
-                returnArray.append((index))
-            except:
-                #Leave the loop id the current device backend name could not be gotten
-                break
-            
-            device.release()
-            index += 1
-
-        return returnArray
+        self.devicesChanged.connect(self.updateDeviceLists)
+        self.updateDeviceLists()
 
     def reloadSetting(self):
         #Utility function, called when we get back to this screen to reload the setttings
@@ -71,30 +48,45 @@ class SettingsPage(QWidget):
             self.filePath.setText(self.settings["savePath"])
             self.screenshotFilePath.setText(self.settings["screenshotPath"])
 
-        #Get the available video and audio devices
-        self.videoDeviceList = self.getVideoDeviceList()
-        self.audioDeviceList = self.getAudioDeviceList()
+        #Get the cached video and audio devices, the probing does not block the page
+        self.updateDeviceLists()
 
-        #Reload the items for the selections lists
-        if self.initialized:
-            self.cameraSelectionBox.currentIndexChanged.disconnect(self.changeCameraSelection)
-            self.cameraSelectionBox.clear()
-            for device in self.videoDeviceList:
-                self.cameraSelectionBox.addItem("Camera " + str(device))
+    def updateDeviceLists(self):
+        #Called when the page is shown and when the device registry found a change
+        self.videoDeviceList, self.audioDeviceList = self.deviceRegistry.getDevices()
+        if not self.initialized:
+            return
+
+        #Reload the items for the selections lists, without saving a selection change
+        self.cameraSelectionBox.blockSignals(True)
+        self.cameraSelectionBox.clear()
+        for device in self.videoDeviceList:
+            self.cameraSelectionBox.addItem("Camera " + str(device))
+        if int(self.settings["cameraChoice"]) in self.videoDeviceList:
             self.cameraSelectionBox.setCurrentIndex(self.videoDeviceList.index(int(self.settings["cameraChoice"])))
-            self.cameraSelectionBox.currentIndexChanged.connect(self.changeCameraSelection)
+        self.cameraSelectionBox.blockSignals(False)
+
+        self.audioSelectionBox.blockSignals(True)
+        self.audioSelectionBox.clear()
+        for device in self.audioDeviceList:
+            self.audioSelectionBox.addItem(str(device[0]) + " - " + device[1])
+        currentIndex = 0
+        for i, device in enumerate(self.audioDeviceList):
+            if device[0] == self.settings["audioChoice"]:
+                currentIndex = i
+                break
+        self.audioSelectionBox.setCurrentIndex(currentIndex)
+        self.audioSelectionBox.blockSignals(False)
 
-            self.audioSelectionBox.currentIndexChanged.disconnect(self.changeAudioSelection)
-            self.audioSelectionBox.clear()
-            for device in self.audioDeviceList:
-                self.audioSelectionBox.addItem(str(device[0]) + " - " + device[1])
-            currentIndex = 0
-            for i, device in enumerate(self.audioDeviceList):
-                if device[0] == self.settings["audioChoice"]:
-                    currentIndex = i
-                    break
-            self.audioSelectionBox.setCurrentIndex(currentIndex)
-            self.audioSelectionBox.currentIndexChanged.connect(self.changeAudioSelection)
+        searchingText = "" if self.deviceRegistry.isReady() else " (searching for devices...)"
+        self.cameraSelectionLabel.setText("Select Camera" + searchingText)
+        self.audioSelectionLabel.setText("Select Audio" + searchingText)
+
+    def refreshDevices(self):
+        #Probing the devices again in the background, the lists are updated when it finishes
+        self.cameraSelectionLabel.setText("Select Camera (searching for devices...)")
+        self.audioSelectionLabel.setText("Select Audio (searching for devices...)")
+        self.deviceRegistry.refresh()
 
     def emitSwitchSignal(self):
         #Couldn't make lambda functions work, so using a normal one
@@ -126,7 +118,7 @@ class SettingsPage(QWidget):
     def changeCameraSelection(self, index):
         #Function to save to the settings variable the currrently selected camera choide
         try:
-            self.settings["cameraChoice"] = self.cameraSelectionBox[index]
+            self.settings["cameraChoice"] = self.videoDeviceList[index]
         except Exception:
             return
 
@@ -234,10 +226,7 @@ class SettingsPage(QWidget):
 
         #Creating widgets for the video camera selection option
         self.cameraSelectionBox = QComboBox(self)
-        for device in self.videoDeviceList:
-            self.cameraSelectionBox.addItem("Camera " + str(device))
         self.cameraSelectionBox.setFixedWidth(400)
-        self.cameraSelectionBox.setCurrentIndex(self.videoDeviceList.index(int(self.settings["cameraChoice"])))
         self.cameraSelectionBox.currentIndexChanged.connect(self.changeCameraSelection)
         self.cameraSelectionLabel = QLabel()
         self.cameraSelectionLabel.setText("Select Camera")
@@ -249,17 +238,7 @@ class SettingsPage(QWidget):
 
         #Creating widgets for the video audio selection option
         self.audioSelectionBox = QComboBox(self)
-        for device in self.audioDeviceList:
-            self.audioSelectionBox.addItem(str(device[0]) + " - " + device[1])
         self.audioSelectionBox.setFixedWidth(400)
-        
-        currentIndex = 0
-        for i, device in enumerate(self.audioDeviceList):
-            if device[0] == self.settings["audioChoice"]:
-                currentIndex = i
-                break
-
-        self.audioSelectionBox.setCurrentIndex(currentIndex)
         self.audioSelectionBox.currentIndexChanged.connect(self.changeAudioSelection)
         self.audioSelectionBox.setStyleSheet(dropDownListStyleSheet)
         self.audioSelectionBox.setCursor(QCursor(Qt.PointingHandCursor))
@@ -268,6 +247,11 @@ class SettingsPage(QWidget):
         self.audioSelectionLabel.setBuddy(self.audioSelectionBox)
         self.audioSelectionLabel.setFixedHeight(100)
         self.audioSelectionLabel.setStyleSheet(labelStyleSheet)
+        self.refreshDevicesBtn = QPushButton("Refresh")
+        self.refreshDevicesBtn.clicked.connect(self.refreshDevices)
+        self.refreshDevicesBtn.setFixedWidth(150)
+        self.refreshDevicesBtn.setStyleSheet(buttonStyleSheet)
+        self.refreshDevicesBtn.setCursor(QCursor(Qt.PointingHandCursor))
 
         # Create box layout, for the positioning of the widgets
         self.mainLayout = QGridLayout()
@@ -279,6 +263,7 @@ class SettingsPage(QWidget):
         self.mainLayout.addWidget(self.screenshotFilePathBtn, 3, 1, Qt.AlignLeft)
         self.mainLayout.addWidget(self.cameraSelectionLabel, 4, 0, 1, 0, Qt.AlignHCenter)
         self.mainLayout.addWidget(self.cameraSelectionBox, 5, 0, Qt.AlignRight)
+        self.mainLayout.addWidget(self.refreshDevicesBtn, 5, 1, Qt.AlignLeft)
         self.mainLayout.addWidget(self.audioSelectionLabel, 6, 0, 1, 0, Qt.AlignHCenter)
         self.mainLayout.addWidget(self.audioSelectionBox, 7, 0, Qt.AlignRight)
         self.mainLayout.addWidget(self.saveBtn, 8, 0, Qt.AlignCenter)
@@ -2,13 +2,16 @@ from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtGui import QImage
 
 import cv2
+import threading
+import time
 # from keras.models import load_model
 # from keras.applications.mobilenet_v2 import preprocess_input
 # import numpy as np
 
 class UIRecorder(QThread):
     #Setting up the signal so this class can communicate with the MainPage
-    changePixmap = pyqtSignal(QImage)
+    #Only signals that a new preview is waiting, the MainPage takes the newest one, so the queued signals cannot pile up
+    previewReady = pyqtSignal()
     soundChangeSignal = pyqtSignal(int)
     errorSignal = pyqtSignal(int)
     stopped = False
@@ -20,6 +23,17 @@ class UIRecorder(QThread):
         self.settings = settings
         self.recorder = recorder
         self.aiSupport = False
+        #The size of the preview on the MainPage, the frames are downscaled to it on this thread
+        self.previewSize = None
+        #A single slot for the newest preview, the image is kept together with the numpy buffer it was made from
+        self.previewInterval = 1.0 / self.recorder.settings.get("previewFps", 30)
+        self.lastPreviewTime = 0
+        self.previewLock = threading.Lock()
+        self.latestPreview = None
+        self.previewSignalPending = False
+        self.droppedPreviews = 0
+        #The live statistics of the recorder can be written on the preview, they are never in the recording
+        self.showHud = self.recorder.settings.get("instrumentationHud", False)
         returnValue = self.recorder.startRecorder()
         if returnValue != 0:
             self.stopped = True
@@ -29,6 +43,10 @@ class UIRecorder(QThread):
     def switchAISupport(self, isChecked):
         #Function for MainPage UIRecorder communication
         self.aiSupport = isChecked
+
+    def setPreviewSize(self, previewSize):
+        #Called from the MainPage when its size changes
+        self.previewSize = previewSize
         
     def run(self):
         #Check if ther was an error
@@ -41,14 +59,54 @@ class UIRecorder(QThread):
             #Handle the returned command, mainly the ones which change the sound volume
             self.handleCommand(command)
 
-            if frame is not None:
-                #Converting the image for the pyqt module
-                rgbImage = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w, _ = rgbImage.shape
-                convertToQtFormat = QImage(rgbImage.data, w, h, QImage.Format_RGB888)
+            #The preview has its own rate, the recording does not wait for the painting of the MainPage
+            if frame is not None and time.monotonic() - self.lastPreviewTime >= self.previewInterval:
+                self.lastPreviewTime = time.monotonic()
+                self.publishPreview(frame)
+
+    def publishPreview(self, frame):
+        #Converting the image for the pyqt module and putting it in the slot, an unshown older preview is replaced
+        profiler = self.recorder.profiler
+        startTime = profiler.begin()
+        preview = self.createPreview(frame)
+        if self.showHud and profiler.enabled:
+            #The frame itself might still be encoded or used for a screenshot
+            if preview is frame:
+                preview = frame.copy()
+            profiler.drawHud(preview)
+        h, w, _ = preview.shape
+        convertToQtFormat = QImage(preview.data, w, h, preview.strides[0], QImage.Format_BGR888)
+        with self.previewLock:
+            if self.latestPreview is not None:
+                self.droppedPreviews += 1
+                profiler.count("droppedPreviews")
+            self.latestPreview = (convertToQtFormat, preview)
+            signalNeeded = not self.previewSignalPending
+            self.previewSignalPending = True
+        profiler.end("uiPreview", startTime)
+        #At most one signal is waiting in the event loop of the MainPage
+        if signalNeeded:
+            self.previewReady.emit()
+
+    def takePreview(self):
+        #Called from the MainPage, returns the newest (image, buffer) pair or None
+        with self.previewLock:
+            preview = self.latestPreview
+            self.latestPreview = None
+            self.previewSignalPending = False
+        return preview
 
-                #Send the image to the mainPage
-                self.changePixmap.emit(convertToQtFormat)
+    def createPreview(self, frame):
+        #Downscaling the frame to the preview size keeping the aspect ratio, Qt reads the BGR pixels directly
+        #The recorder never modifies a frame after returning it, so it can be shown without a copy
+        h, w, _ = frame.shape
+        if self.previewSize is None:
+            return frame
+        scale = min(self.previewSize[0] / float(w), self.previewSize[1] / float(h))
+        size = (max(int(w * scale), 1), max(int(h * scale), 1))
+        if size == (w, h):
+            return frame
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
         
     def handleCommand(self, command):
         #If there is no command return
@@ -67,8 +125,13 @@ class UIRecorder(QThread):
             self.errorValue = 4
             self.errorSignal.emit(self.errorValue)
 
-    def stop(self):
+    def stop(self, finalizationQueue=None):
+        #Letting the loop finish the current frame, then only the devices are released here
+        #The files are finalized on the finalizationQueue, the returned job reports the progress
         self.stopped = True
+        self.wait()
+        job = None
         if not self.startError:
-            self.recorder.stopRecorder()
-        self.quit()
\ No newline at end of file
+            job = self.recorder.stopRecorder(finalizationQueue)
+        self.quit()
+        return job
\ No newline at end of file
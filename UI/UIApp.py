@@ -39,6 +39,11 @@ class UIApp(QWidget):
         #Switching between the screens
         self.stackedWidget.setCurrentIndex(index)
         
+    def closeEvent(self, event):
+        #The recordings which are still being saved are finished before the application exits
+        self.mainPage.finishRecordings()
+        super().closeEvent(event)
+
     def initUI(self):
         #Setting up the title and the geometry
         self.setWindowTitle(self.title)
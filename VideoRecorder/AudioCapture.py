@@ -0,0 +1,100 @@
+import time
+
+import numpy
+import pyaudio
+
+class AudioRingBuffer:
+    def __init__(self, capacity):
+        #Ring buffer for a single writer and a single reader thread, the two counters only grow and each is changed by one side only
+        #so no lock is needed, the data is copied before the counter is moved
+        self.buffer = numpy.zeros(capacity, dtype=numpy.int16)
+        self.capacity = capacity
+        self.writeCounter = 0
+        self.readCounter = 0
+        self.droppedSamples = 0
+
+    def available(self):
+        return self.writeCounter - self.readCounter
+
+    def write(self, samples):
+        #Called by the audio callback, if the reader fell behind the newest samples are dropped and counted
+        count = min(len(samples), self.capacity - self.available())
+        self.droppedSamples += len(samples) - count
+        start = self.writeCounter % self.capacity
+        first = min(count, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:count - first] = samples[first:count]
+        self.writeCounter += count
+
+    def read(self, out):
+        #Copies the available samples into the given buffer, returns the number of copied samples
+        count = min(len(out), self.available())
+        start = self.readCounter % self.capacity
+        first = min(count, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:count] = self.buffer[:count - first]
+        self.readCounter += count
+        return count
+
+def applyGain(samples, gain, scratch):
+    #Applying the volume in place with fixed point math on int32, without creating new arrays
+    #scratch is an int32 buffer at least as long as the samples
+    scratch = scratch[:len(samples)]
+    numpy.multiply(samples, int(gain * 32768), out=scratch, dtype=numpy.int32)
+    numpy.right_shift(scratch, 15, out=scratch)
+    numpy.clip(scratch, -32768, 32767, out=scratch)
+    numpy.copyto(samples, scratch, casting='unsafe')
+    return samples
+
+class AudioCapture:
+    def __init__(self, deviceIndex, channels, bufferSeconds=4.0, chunkSize=1024):
+        #The audio is captured by the PyAudio callback on its own thread, at the native rate of the device
+        self.audio = pyaudio.PyAudio()
+        try:
+            deviceInfo = self.audio.get_device_info_by_index(deviceIndex)
+            self.frameRate = int(deviceInfo.get('defaultSampleRate'))
+            self.channels = channels
+            self.ringBuffer = AudioRingBuffer(int(self.frameRate * bufferSeconds) * channels)
+            self.stream = self.audio.open(format=pyaudio.paInt16, channels=channels,
+                                          rate=self.frameRate, input=True,
+                                          frames_per_buffer=chunkSize,
+                                          input_device_index=deviceIndex,
+                                          stream_callback=self.audioCallback, start=False)
+        except Exception:
+            self.audio.terminate()
+            raise
+        self.sampleWidth = self.audio.get_sample_size(pyaudio.paInt16)
+        self.overflowCounter = 0
+
+        #Monotonic time of the first captured sample and of the last callback, for the synchronization with the video
+        self.firstSampleTime = None
+        self.lastCallbackTime = None
+        self.capturedFrames = 0
+
+    def audioCallback(self, inData, frameCount, timeInfo, status):
+        #Runs on the audio thread of PortAudio, only stamps the chunk and copies the data into the ring buffer
+        callbackTime = time.monotonic()
+        if self.firstSampleTime is None:
+            self.firstSampleTime = callbackTime - frameCount / float(self.frameRate)
+        self.lastCallbackTime = callbackTime
+        self.capturedFrames += frameCount
+        if status & pyaudio.paInputOverflow:
+            self.overflowCounter += 1
+        self.ringBuffer.write(numpy.frombuffer(inData, dtype=numpy.int16))
+        return (None, pyaudio.paContinue)
+
+    def start(self):
+        self.stream.start_stream()
+
+    def isActive(self):
+        return self.stream is not None and self.stream.is_active()
+
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+            except OSError:
+                pass
+            self.stream.close()
+            self.stream = None
+        self.audio.terminate()
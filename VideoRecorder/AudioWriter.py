@@ -0,0 +1,92 @@
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy
+
+from VideoRecorder.AudioCapture import applyGain
+
+class AudioWriter(threading.Thread):
+    def __init__(self, path, ringBuffer, channels, sampleWidth, frameRate, volumeLevel=1.0, chunkSize=1024, profiler=None, rawPath=None):
+        super().__init__(name="AudioWriter", daemon=True)
+        #The wav file is written while recording, so the memory does not grow with the length of the recording
+        self.channels = channels
+        self.sampleWidth = sampleWidth
+        self.frameRate = frameRate
+        self.waveFile = self.openWave(path)
+        #Optional second file with the audio before the volume is applied, for the session archive
+        self.rawWaveFile = None
+        if rawPath is not None:
+            self.rawWaveFile = self.openWave(rawPath)
+        #The splits of a segmented recording, as (sample, path of the next file, callback) in the order of the samples
+        self.pendingSplits = deque()
+
+        #The audio is taken from the ring buffer of the capture into reused buffers, the volume is applied in place
+        self.ringBuffer = ringBuffer
+        self.volumeLevel = volumeLevel
+        self.chunk = numpy.empty(chunkSize * channels, dtype=numpy.int16)
+        self.scratch = numpy.empty(chunkSize * channels, dtype=numpy.int32)
+        self.pollTime = chunkSize / float(frameRate) / 2
+        self.stopped = False
+        self.writtenSamples = 0
+        #Optional StageProfiler, measuring the time of writing a chunk
+        self.profiler = profiler
+
+    def openWave(self, path):
+        waveFile = wave.open(path, 'wb')
+        waveFile.setnchannels(self.channels)
+        waveFile.setsampwidth(self.sampleWidth)
+        waveFile.setframerate(self.frameRate)
+        return waveFile
+
+    def splitAt(self, sample, path, onSplit):
+        #The file is closed at the given sample of the recording and the audio goes on in a new file at path
+        #onSplit is called on the writer thread with the sample where the file was split, later than asked if it was already written
+        self.pendingSplits.append((sample, path, onSplit))
+
+    def close(self):
+        #Writing out the audio which is still in the ring buffer and closing the file
+        self.stopped = True
+        self.join()
+        #The splits after the end of the audio still open their file, so every segment has one
+        self.writeSamples(self.chunk[:0], final=True)
+        self.waveFile.close()
+        if self.rawWaveFile is not None:
+            self.rawWaveFile.close()
+
+    def writeAvailable(self):
+        #Writing every full chunk, returns whether there was anything to write
+        wroteData = False
+        while True:
+            startTime = self.profiler.begin() if self.profiler is not None else 0
+            count = self.ringBuffer.read(self.chunk)
+            if count == 0:
+                return wroteData
+            if self.rawWaveFile is not None:
+                self.rawWaveFile.writeframes(self.chunk[:count])
+            samples = applyGain(self.chunk[:count], self.volumeLevel, self.scratch)
+            self.writeSamples(samples)
+            if self.profiler is not None:
+                self.profiler.end("audioWrite", startTime)
+            wroteData = True
+
+    def writeSamples(self, samples, final=False):
+        #Doing the splits which are reached by the samples, then writing the rest to the current file
+        while self.pendingSplits and (final or self.writtenSamples + len(samples) >= self.pendingSplits[0][0]):
+            sample, path, onSplit = self.pendingSplits.popleft()
+            count = min(max(sample - self.writtenSamples, 0), len(samples))
+            self.waveFile.writeframes(samples[:count])
+            self.writtenSamples += count
+            samples = samples[count:]
+            self.waveFile.close()
+            self.waveFile = self.openWave(path)
+            onSplit(self.writtenSamples)
+        self.waveFile.writeframes(samples)
+        self.writtenSamples += len(samples)
+
+    def run(self):
+        while not self.stopped:
+            if not self.writeAvailable():
+                time.sleep(self.pollTime)
+        self.writeAvailable()
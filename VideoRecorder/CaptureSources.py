@@ -0,0 +1,201 @@
+import threading
+import time
+import wave
+
+import cv2
+import numpy
+
+from VideoRecorder.AudioCapture import AudioCapture, AudioRingBuffer
+
+class FramePacer:
+    def __init__(self, frameRate):
+        #Waits until the next frame is due, like a camera, a late frame does not make the following ones come faster
+        self.interval = 1.0 / frameRate
+        self.nextTime = None
+
+    def wait(self):
+        now = time.monotonic()
+        if self.nextTime is None or now - self.nextTime > self.interval:
+            self.nextTime = now
+        elif self.nextTime > now:
+            time.sleep(self.nextTime - now)
+        self.nextTime += self.interval
+
+class SyntheticVideoSource:
+    def __init__(self, width=640, height=480, frameRate=30, realtime=True):
+        #Generated frames with a moving square on a gradient, it can be used in place of a cv2.VideoCapture
+        #Without realtime the frames come as fast as they are read, for measuring the throughput
+        self.width = width
+        self.height = height
+        self.frameRate = frameRate
+        self.pacer = FramePacer(frameRate) if realtime else None
+        gradient = numpy.linspace(0, 255, width, dtype=numpy.uint8)
+        self.background = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        self.background[:] = gradient[None, :, None]
+        self.squareSize = max(height // 6, 1)
+        self.frameIndex = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, propertyId):
+        properties = {cv2.CAP_PROP_FPS: self.frameRate, cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height}
+        return properties.get(propertyId, 0)
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        if self.pacer is not None:
+            self.pacer.wait()
+        frame = self.background.copy()
+        x = (self.frameIndex * 4) % max(self.width - self.squareSize, 1)
+        y = (self.frameIndex * 3) % max(self.height - self.squareSize, 1)
+        frame[y:y + self.squareSize, x:x + self.squareSize] = (0, 0, 255)
+        self.frameIndex += 1
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+class VideoFileSource:
+    def __init__(self, path, realtime=True, loop=True):
+        #Replaying a video file as if it was a camera, at the frame rate of the file and from the start again at the end
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Cannot open the video file: " + str(path))
+        self.frameRate = self.capture.get(cv2.CAP_PROP_FPS) or 30
+        self.pacer = FramePacer(self.frameRate) if realtime else None
+        self.loop = loop
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def get(self, propertyId):
+        if propertyId == cv2.CAP_PROP_FPS:
+            return self.frameRate
+        return self.capture.get(propertyId)
+
+    def read(self):
+        if self.pacer is not None:
+            self.pacer.wait()
+        ret, frame = self.capture.read()
+        if not ret and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read()
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
+class GeneratedAudioSource:
+    def __init__(self, frameRate, channels, bufferSeconds=4.0, chunkSize=1024):
+        #Has the same attributes as the AudioCapture, the chunks are written to the ring buffer by a thread in real time
+        self.frameRate = frameRate
+        self.channels = channels
+        self.chunkSize = chunkSize
+        self.ringBuffer = AudioRingBuffer(int(frameRate * bufferSeconds) * channels)
+        self.sampleWidth = 2
+        self.overflowCounter = 0
+        self.firstSampleTime = None
+        self.lastCallbackTime = None
+        self.capturedFrames = 0
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    def generate(self, frameCount):
+        #Returns the next frameCount frames as int16 samples with the channels interleaved, or None at the end
+        raise NotImplementedError
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="GeneratedAudio", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        pacer = FramePacer(self.frameRate / float(self.chunkSize))
+        while not self.stopEvent.is_set():
+            pacer.wait()
+            samples = self.generate(self.chunkSize)
+            if samples is None:
+                break
+            #Stamped the same way as the chunks of the audio callback
+            callbackTime = time.monotonic()
+            frameCount = len(samples) // self.channels
+            if self.firstSampleTime is None:
+                self.firstSampleTime = callbackTime - frameCount / float(self.frameRate)
+            self.lastCallbackTime = callbackTime
+            self.capturedFrames += frameCount
+            self.ringBuffer.write(samples)
+        self.stopEvent.set()
+
+    def isActive(self):
+        return self.thread is not None and not self.stopEvent.is_set()
+
+    def close(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+
+class ToneAudioSource(GeneratedAudioSource):
+    def __init__(self, channels, frequency=440.0, frameRate=48000, amplitude=0.2, bufferSeconds=4.0, chunkSize=1024):
+        super().__init__(frameRate, channels, bufferSeconds, chunkSize)
+        #A sine tone, the phase continues between the chunks
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.generatedFrames = 0
+
+    def generate(self, frameCount):
+        times = (numpy.arange(frameCount) + self.generatedFrames) / float(self.frameRate)
+        self.generatedFrames += frameCount
+        tone = (numpy.sin(2 * numpy.pi * self.frequency * times) * self.amplitude * 32767).astype(numpy.int16)
+        return numpy.repeat(tone, self.channels)
+
+class WavAudioSource(GeneratedAudioSource):
+    def __init__(self, path, channels, loop=True, bufferSeconds=4.0, chunkSize=1024):
+        #Replaying a 16 bit wav file in real time, mixed to the channels of the recording
+        with wave.open(path, 'rb') as waveFile:
+            if waveFile.getsampwidth() != 2:
+                raise ValueError("Only 16 bit wav files are supported: " + str(path))
+            frameRate = waveFile.getframerate()
+            fileChannels = waveFile.getnchannels()
+            data = numpy.frombuffer(waveFile.readframes(waveFile.getnframes()), dtype=numpy.int16)
+        super().__init__(frameRate, channels, bufferSeconds, chunkSize)
+        data = data.reshape(-1, fileChannels)
+        if fileChannels != channels:
+            data = numpy.repeat(data.mean(axis=1, keepdims=True), channels, axis=1).astype(numpy.int16)
+        self.samples = data.reshape(-1)
+        self.loop = loop
+        self.position = 0
+
+    def generate(self, frameCount):
+        count = frameCount * self.channels
+        if self.position >= len(self.samples):
+            if not self.loop or len(self.samples) == 0:
+                return None
+            self.position = 0
+        samples = self.samples[self.position:self.position + count]
+        self.position += count
+        return samples
+
+def createVideoSource(settings):
+    #The camera is the default, the synthetic frames and the video files are for testing and benchmarking
+    source = settings.get("videoSource", "camera")
+    if source == "camera":
+        return cv2.VideoCapture(settings["cameraChoice"])
+    if source == "synthetic":
+        width, height = settings.get("syntheticVideoSize", [640, 480])
+        return SyntheticVideoSource(width, height, settings.get("syntheticVideoFps", 30), settings.get("syntheticRealtime", True))
+    if source == "file":
+        return VideoFileSource(settings["videoSourcePath"], settings.get("syntheticRealtime", True))
+    raise ValueError("Unknown video source: " + str(source))
+
+def createAudioSource(settings, channels, bufferSeconds=4.0):
+    #The audio device is the default, the tone and the wav files are for testing and benchmarking
+    source = settings.get("audioSource", "device")
+    if source == "device":
+        return AudioCapture(settings["audioChoice"], channels, bufferSeconds=bufferSeconds)
+    if source == "tone":
+        return ToneAudioSource(channels, settings.get("toneFrequency", 440.0), bufferSeconds=bufferSeconds)
+    if source == "wav":
+        return WavAudioSource(settings["audioSourcePath"], channels, bufferSeconds=bufferSeconds)
+    raise ValueError("Unknown audio source: " + str(source))
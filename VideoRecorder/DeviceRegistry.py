@@ -0,0 +1,111 @@
+import glob
+import os
+import threading
+
+import cv2
+import pyaudio
+
+def probeVideoDevices():
+    #Since there is no built-in method to acquire the list of video capture devices, I loop through them until I get an error, meaning no available device
+    index = 0
+    returnArray = []
+    while True:
+        device = cv2.VideoCapture(index)
+        try:
+            device.getBackendName()
+            returnArray.append((index))
+        except:
+            #Leave the loop id the current device backend name could not be gotten
+            break
+
+        device.release()
+        index += 1
+
+    return returnArray
+
+def probeAudioDevices():
+    #Get the list of audio input devices as (index, name) pairs
+    p = pyaudio.PyAudio()
+    info = p.get_host_api_info_by_index(0)
+    deviceNumber = info.get('deviceCount')
+    returnArray = []
+
+    for i in range(deviceNumber):
+        if (p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels')) > 0:
+            returnArray.append((i, p.get_device_info_by_host_api_device_index(0, i).get('name')))
+
+    p.terminate()
+    return returnArray
+
+def hotplugSignature():
+    #The device nodes of the cameras and sound cards, it changes when a device is plugged in or out
+    #Returns None where these are not available (for example on Windows), there only a manual refresh is possible
+    if not os.path.isdir("/dev"):
+        return None
+    signature = sorted(glob.glob("/dev/video*"))
+    if os.path.isdir("/sys/class/sound"):
+        signature += sorted(os.listdir("/sys/class/sound"))
+    return tuple(signature)
+
+class DeviceRegistry(threading.Thread):
+    def __init__(self, pollInterval=2.0):
+        super().__init__(name="DeviceRegistry", daemon=True)
+        #Probing the devices takes seconds, so it is done on this thread and the results are cached
+        #The devices are probed again when requested or when the hotplug signature changes
+        self.pollInterval = pollInterval
+        self.lock = threading.Lock()
+        self.videoDevices = []
+        self.audioDevices = []
+        self.ready = False
+        self.refreshEvent = threading.Event()
+        self.stopEvent = threading.Event()
+        #Functions called from this thread after every probe
+        self.listeners = []
+        self.refreshEvent.set()
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def getDevices(self):
+        #Returns the cached (videoDevices, audioDevices) lists immediately, they are empty until the first probe finishes
+        with self.lock:
+            return list(self.videoDevices), list(self.audioDevices)
+
+    def isReady(self):
+        return self.ready
+
+    def refresh(self):
+        self.refreshEvent.set()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.refreshEvent.set()
+
+    def run(self):
+        signature = hotplugSignature()
+        while not self.stopEvent.is_set():
+            self.refreshEvent.wait(self.pollInterval)
+            if self.stopEvent.is_set():
+                break
+            newSignature = hotplugSignature()
+            if not self.refreshEvent.is_set() and newSignature == signature:
+                continue
+            self.refreshEvent.clear()
+            signature = newSignature
+            self.probe()
+
+    def probe(self):
+        try:
+            videoDevices = probeVideoDevices()
+            audioDevices = probeAudioDevices()
+        except Exception as e:
+            print("Probing the devices failed: ", e)
+            return
+        with self.lock:
+            changed = videoDevices != self.videoDevices or audioDevices != self.audioDevices or not self.ready
+            self.videoDevices = videoDevices
+            self.audioDevices = audioDevices
+            self.ready = True
+        if changed:
+            for listener in self.listeners:
+                listener()
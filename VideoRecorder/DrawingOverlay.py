@@ -0,0 +1,39 @@
+import cv2
+import numpy
+
+class DrawingOverlay:
+    def __init__(self, color=(255, 255, 255), thickness=2):
+        #The drawn lines are kept on a canvas with a mask, only the new segments are drawn when a point is added
+        self.color = color
+        self.thickness = thickness
+        self.canvas = None
+        self.mask = None
+        self.empty = True
+
+    def reset(self, frameShape):
+        #Creating an empty canvas for frames of the given shape
+        self.canvas = numpy.zeros(frameShape, dtype=numpy.uint8)
+        self.mask = numpy.zeros(frameShape[:2] + (1,), dtype=numpy.uint8)
+        self.empty = True
+
+    def addSegment(self, startPoint, endPoint):
+        #A segment from a point to itself is the first dot of a new line
+        if self.canvas is None:
+            return
+        cv2.line(self.canvas, startPoint, endPoint, self.color, thickness=self.thickness)
+        cv2.line(self.mask, startPoint, endPoint, 1, thickness=self.thickness)
+        self.empty = False
+
+    def clear(self):
+        if self.canvas is not None:
+            self.canvas.fill(0)
+            self.mask.fill(0)
+        self.empty = True
+
+    def apply(self, frame):
+        #Copying the drawn pixels onto the frame in one operation, the cost does not depend on how much was drawn
+        if self.canvas is None or self.canvas.shape != frame.shape:
+            self.reset(frame.shape)
+        if not self.empty:
+            numpy.copyto(frame, self.canvas, where=self.mask.view(bool))
+        return frame
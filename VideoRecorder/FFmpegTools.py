@@ -0,0 +1,43 @@
+import os
+import subprocess
+
+def getFFmpegPath(settings=None):
+    #The path can be given in the settings, otherwise the ffmpeg binary shipped with imageio-ffmpeg is used
+    if settings is not None and settings.get("ffmpegPath"):
+        return settings["ffmpegPath"]
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def remuxAudioVideo(ffmpegPath, videoPath, audioPath, outputPath, videoScale=1.0, audioOffset=0.0):
+    #The video stream is copied as it is, only the audio is encoded, so the time does not depend on the video size
+    #videoScale stretches the timestamps of the video to the real length of the recording
+    #audioOffset is the start of the audio compared to the first frame in seconds, negative if the audio started earlier
+    command = [ffmpegPath, "-y", "-loglevel", "error",
+               "-itsscale", "%.9f" % videoScale, "-i", videoPath]
+    if audioOffset >= 0:
+        command += ["-itsoffset", "%.6f" % audioOffset, "-i", audioPath]
+    else:
+        command += ["-ss", "%.6f" % -audioOffset, "-i", audioPath]
+    command += ["-map", "0:v:0", "-map", "1:a:0",
+                "-c:v", "copy", "-c:a", "aac", "-b:a", "128k",
+                "-shortest", outputPath]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        print("Merging the audio and video failed: ", result.stderr.decode(errors="replace"))
+        return False
+    return True
+
+def concatenateVideos(ffmpegPath, inputPaths, outputPath):
+    #Joining mp4 files with the same streams one after the other, the streams are copied, so only the files are read and written
+    listPath = outputPath + ".txt"
+    with open(listPath, "w") as listFile:
+        for path in inputPaths:
+            listFile.write("file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n")
+    command = [ffmpegPath, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", listPath,
+               "-map", "0", "-c", "copy", outputPath]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    os.remove(listPath)
+    if result.returncode != 0:
+        print("Joining the segments failed: ", result.stderr.decode(errors="replace"))
+        return False
+    return True
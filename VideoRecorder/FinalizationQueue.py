@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+
+class FinalizationJob:
+    def __init__(self, name, steps):
+        #The work left after a recording is stopped, as (description, function) steps run one after the other
+        #A step returning False fails the job, the later steps are skipped so the files of the recording are kept
+        self.name = name
+        self.steps = steps
+        self.state = "queued"
+        self.currentStep = ""
+        self.progress = 0.0
+        self.error = None
+        self.duration = None
+        self.doneEvent = threading.Event()
+
+    def run(self, onProgress=None):
+        self.state = "running"
+        startTime = time.monotonic()
+        for index, (description, step) in enumerate(self.steps):
+            self.currentStep = description
+            if onProgress is not None:
+                onProgress(self)
+            try:
+                succeeded = step() is not False
+            except Exception as e:
+                self.error = e
+                succeeded = False
+            if not succeeded:
+                print("Finalizing " + self.name + " failed at: " + description, self.error or "")
+                self.state = "failed"
+                break
+            self.progress = (index + 1) / float(len(self.steps))
+        else:
+            self.state = "done"
+        self.currentStep = ""
+        self.duration = time.monotonic() - startTime
+        self.doneEvent.set()
+        if onProgress is not None:
+            onProgress(self)
+
+    def isDone(self):
+        return self.doneEvent.is_set()
+
+    def wait(self, timeout=None):
+        return self.doneEvent.wait(timeout)
+
+    def status(self):
+        return {"name": self.name, "state": self.state, "step": self.currentStep, "progress": self.progress,
+                "duration": self.duration, "error": None if self.error is None else str(self.error)}
+
+class FinalizationQueue:
+    def __init__(self, maxWorkers=1):
+        #The jobs are run in the order they were submitted, by at most maxWorkers threads at the same time
+        #Every finalizer runs its own ffmpeg processes, so a few of them are enough to keep the disk busy
+        self.maxWorkers = max(int(maxWorkers), 1)
+        self.jobQueue = queue.Queue()
+        self.lock = threading.Lock()
+        self.jobs = []
+        self.workers = []
+        #Functions called from the worker threads with the job, when it starts a step and when it is finished
+        self.listeners = []
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def submit(self, job):
+        with self.lock:
+            #Forgetting the finished jobs, the listeners already got their result
+            self.jobs = [oldJob for oldJob in self.jobs if not oldJob.isDone()]
+            self.jobs.append(job)
+            #The workers are only started when there is work for them
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            if len(self.workers) < min(self.maxWorkers, len(self.jobs)):
+                worker = threading.Thread(target=self.runWorker, name="Finalizer", daemon=True)
+                self.workers.append(worker)
+                worker.start()
+            #Queued under the lock, so an idle worker cannot exit between the check above and the put
+            self.jobQueue.put(job)
+        self.notify(job)
+        return job
+
+    def runWorker(self):
+        #A worker exits when the queue stays empty, a new one is started by the next submit
+        while True:
+            try:
+                job = self.jobQueue.get(timeout=1.0)
+            except queue.Empty:
+                with self.lock:
+                    if self.jobQueue.empty():
+                        self.workers.remove(threading.current_thread())
+                        return
+                continue
+            job.run(self.notify)
+
+    def notify(self, job):
+        for listener in self.listeners:
+            listener(job)
+
+    def activeJobs(self):
+        #The queued and running jobs, oldest first
+        with self.lock:
+            return [job for job in self.jobs if not job.isDone()]
+
+    def wait(self, timeout=None):
+        #Waiting for every submitted job, returns whether all of them finished in time
+        endTime = None if timeout is None else time.monotonic() + timeout
+        for job in self.activeJobs():
+            remaining = None if endTime is None else max(endTime - time.monotonic(), 0)
+            if not job.wait(remaining):
+                return False
+        return True
@@ -0,0 +1,98 @@
+from collections import deque
+
+import cv2
+import numpy
+
+class FingertipTracker:
+    def __init__(self, maxAge=0.6, maxPoints=20, minPoints=4, historySize=90):
+        #Follows the drawing fingertip with optical flow on the frames between two detections
+        #The detector re-anchors the tracker, without a new anchor for maxAge seconds the tracking stops
+        self.maxAge = maxAge
+        self.maxPoints = maxPoints
+        self.minPoints = minPoints
+        self.flowParameters = dict(winSize=(15, 15), maxLevel=2,
+                                   criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+        self.frame = None
+        self.timestamp = None
+        self.gray = None
+        self.points = None
+        self.tip = None
+        self.lastAnchorTime = None
+        #The tracked tip positions with their capture time, a detection made on an older frame is moved along them
+        self.history = deque(maxlen=historySize)
+        self.trackedFrames = 0
+
+    def isActive(self):
+        return self.points is not None
+
+    def stop(self):
+        self.gray = None
+        self.points = None
+        self.tip = None
+        self.lastAnchorTime = None
+        self.history.clear()
+
+    def update(self, frame, timestamp):
+        #Called with every clean frame before anything is drawn on it, returns the new tip position or None
+        self.frame = frame
+        self.timestamp = timestamp
+        if not self.isActive():
+            return None
+        if timestamp - self.lastAnchorTime > self.maxAge:
+            self.stop()
+            return None
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        newPoints, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, self.points, None, **self.flowParameters)
+        found = status.reshape(-1) == 1
+        if found.sum() < self.minPoints:
+            self.stop()
+            return None
+
+        #The median movement of the points is robust against the few points which slip off the hand
+        movement = numpy.median(newPoints[found] - self.points[found], axis=0).reshape(2)
+        self.points = newPoints[found].reshape(-1, 1, 2)
+        self.tip = self.tip + movement
+        self.gray = gray
+        self.history.append((timestamp, self.tip.copy()))
+        self.trackedFrames += 1
+        return self.tipPoint()
+
+    def anchor(self, point, boundingBox, timestamp):
+        #Re-anchoring on a detection made on the frame captured at timestamp, returns the tip on the current frame
+        #The detection is older than the current frame, so the movement tracked since then is added to it
+        movement = numpy.zeros(2, dtype=numpy.float32)
+        if self.isActive():
+            movement = self.tip - self.tipAt(timestamp)
+        else:
+            self.gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        self.tip = numpy.array(point, dtype=numpy.float32) + movement
+
+        #New points are chosen on the hand in the current frame, the old ones drift away after a while
+        yMin, xMin, yMax, xMax = boundingBox
+        height, width = self.gray.shape
+        left = int(min(max(xMin + movement[0], 0), width - 1))
+        right = int(min(max(xMax + movement[0], left + 1), width))
+        top = int(min(max(yMin + movement[1], 0), height - 1))
+        bottom = int(min(max(yMax + movement[1], top + 1), height))
+        corners = cv2.goodFeaturesToTrack(self.gray[top:bottom, left:right], self.maxPoints, 0.01, 5)
+        if corners is None or len(corners) < self.minPoints:
+            self.stop()
+            return (int(point[0] + movement[0]), int(point[1] + movement[1]))
+
+        self.points = (corners + numpy.array([left, top], dtype=numpy.float32)).astype(numpy.float32)
+        self.lastAnchorTime = timestamp
+        self.history.clear()
+        self.history.append((self.timestamp, self.tip.copy()))
+        return self.tipPoint()
+
+    def tipAt(self, timestamp):
+        #The tracked tip at the newest frame not later than timestamp, or the oldest one known
+        for historyTime, tip in reversed(self.history):
+            if historyTime <= timestamp:
+                return tip
+        return self.history[0][1] if self.history else self.tip
+
+    def tipPoint(self):
+        return (int(round(self.tip[0])), int(round(self.tip[1])))
@@ -0,0 +1,130 @@
+import queue
+import threading
+import traceback
+
+#Marker object sent through the queues when a stage finishes, so the following stages know they can stop too
+PIPELINE_END = object()
+
+class PipelineFrame:
+    def __init__(self, frame, timestamp):
+        #A single captured frame travelling through the pipeline together with the data the stages attach to it
+        self.frame = frame
+        self.timestamp = timestamp
+        self.command = None
+
+class FrameQueue:
+    #The possible behaviours when the queue is full:
+    #block - the producer waits until there is space (backpressure)
+    #dropOldest - the oldest waiting item is thrown away to make space for the new one
+    policies = ("block", "dropOldest")
+
+    def __init__(self, maxSize, policy="block", onDrop=None):
+        if policy not in self.policies:
+            raise ValueError("Invalid queue policy: " + str(policy))
+        self.queue = queue.Queue(maxsize=maxSize)
+        self.policy = policy
+        #Optional function called with the dropped and the kept item, so no information is lost silently
+        self.onDrop = onDrop
+        self.droppedCounter = 0
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        #With backpressure the producer simply waits for the consumer
+        if self.policy == "block":
+            self.queue.put(item)
+            return True
+
+        with self.lock:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+
+            self.droppedCounter += 1
+            #Make space by removing the oldest item, the consumer can only free more space in the meantime
+            try:
+                droppedItem = self.queue.get_nowait()
+                if self.onDrop is not None:
+                    self.onDrop(droppedItem, item)
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(item)
+            return True
+
+    def putEnd(self):
+        #The end marker can never be dropped, so if needed an older item makes space for it
+        with self.lock:
+            while True:
+                try:
+                    self.queue.put_nowait(PIPELINE_END)
+                    return
+                except queue.Full:
+                    if self.policy == "block":
+                        break
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+        self.queue.put(PIPELINE_END)
+
+    def get(self, timeout=None):
+        #Raises queue.Empty if nothing arrived in the given time
+        return self.queue.get(timeout=timeout)
+
+    def depth(self):
+        return self.queue.qsize()
+
+class PipelineStage(threading.Thread):
+    def __init__(self, name, function, inputQueue, outputQueues, stopEvent):
+        super().__init__(name=name, daemon=True)
+        #The function gets an item from the input queue and returns the item for the next stages, or None to skip it
+        #A stage without an input queue is a source, it is called repeatedly until the stop event is set
+        self.function = function
+        self.inputQueue = inputQueue
+        self.outputQueues = outputQueues
+        self.stopEvent = stopEvent
+        #The exception which stopped the stage, the recorder reports it instead of waiting for frames
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                if self.inputQueue is None:
+                    if self.stopEvent.is_set():
+                        break
+                    item = None
+                else:
+                    try:
+                        item = self.inputQueue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if item is PIPELINE_END:
+                        break
+
+                result = self.function(item)
+                if result is None:
+                    continue
+                for outputQueue in self.outputQueues:
+                    outputQueue.put(result)
+        except Exception as e:
+            #Every error is reported back to the recorder and stops the capture, the rest of the pipeline still finishes
+            if not isinstance(e, OSError):
+                traceback.print_exc()
+            self.error = e
+            self.stopEvent.set()
+            self.drainInput()
+        finally:
+            for outputQueue in self.outputQueues:
+                outputQueue.putEnd()
+
+    def drainInput(self):
+        #Taking the items of the earlier stages until they finish, so a blocking queue cannot keep them waiting
+        if self.inputQueue is None:
+            return
+        while True:
+            try:
+                if self.inputQueue.get(timeout=0.1) is PIPELINE_END:
+                    return
+            except queue.Empty:
+                continue
@@ -0,0 +1,63 @@
+import re
+
+import cv2
+import numpy
+
+#The gesture classes of the model, by the ids of its label map
+gestureClasses = [{'id':1, 'name':"draw"},{'id':2, 'name':"clear"},{'id':3, 'name':"mute"},{'id':4, 'name':"voicedown"},{'id':5, 'name':"voiceup"}]
+
+def readModelInputSize(configPath, defaultSize=(320, 320)):
+    #Reading the fixed input size (width, height) of the model from the fixed_shape_resizer of the pipeline config
+    try:
+        with open(configPath) as configFile:
+            config = configFile.read()
+    except OSError:
+        return defaultSize
+    match = re.search(r"fixed_shape_resizer\s*{\s*height:\s*(\d+)\s*width:\s*(\d+)", config)
+    if match is None:
+        return defaultSize
+    return (int(match.group(2)), int(match.group(1)))
+
+class ModelInputPreparer:
+    def __init__(self, inputSize):
+        #The frame is resized into the same buffer every time, with the batch dimension already added
+        #The model was trained with a stretching resizer, so the frame is stretched as well and the relative boxes stay valid
+        self.inputSize = inputSize
+        self.buffer = numpy.zeros((1, inputSize[1], inputSize[0], 3), dtype=numpy.uint8)
+
+    def prepare(self, frame):
+        cv2.resize(frame, self.inputSize, dst=self.buffer[0], interpolation=cv2.INTER_LINEAR)
+        return self.buffer
+
+class DetectionDecoder:
+    def __init__(self, classes, threshold):
+        #Lookup table from the class id of the model to the name of the gesture, unknown ids map to None
+        self.threshold = threshold
+        self.classLookup = numpy.full(max(c['id'] for c in classes) + 2, None, dtype=object)
+        for c in classes:
+            self.classLookup[c['id']] = c['name']
+        self.unknownClassId = len(self.classLookup) - 1
+
+    def decode(self, detectionBoxes, detectionClasses, detectionScores, frameSize, topK=1):
+        #Returns the best topK detections above the threshold as (name, score, [yMin, xMin, yMax, xMax]), the best first
+        detectionScores = numpy.asarray(detectionScores)
+        if len(detectionScores) == 0 or topK <= 0:
+            return []
+
+        #Scores under the threshold are masked out, then only the best topK are selected and sorted
+        maskedScores = numpy.where(detectionScores >= self.threshold, detectionScores, -1.0)
+        k = min(topK, len(maskedScores))
+        best = numpy.argpartition(-maskedScores, k - 1)[:k]
+        best = best[numpy.argsort(-maskedScores[best], kind="stable")]
+        best = best[maskedScores[best] >= 0]
+        if len(best) == 0:
+            return []
+
+        #Scaling the relative boxes to the frame size in one operation
+        boxScale = numpy.array([frameSize[1], frameSize[0], frameSize[1], frameSize[0]], dtype=numpy.float32)
+        boxes = (numpy.asarray(detectionBoxes)[best] * boxScale).astype(numpy.int32)
+        classIds = numpy.asarray(detectionClasses).astype(numpy.int32)[best]
+        classIds = numpy.where((classIds >= 0) & (classIds < self.unknownClassId), classIds, self.unknownClassId)
+        names = self.classLookup[classIds]
+
+        return [(names[i], float(detectionScores[best[i]]), boxes[i].tolist()) for i in range(len(best))]
@@ -0,0 +1,169 @@
+import os
+
+import cv2
+import numpy
+
+#Default model files of the backends, relative to the root of the application
+defaultModelPaths = {
+    "tensorflow": os.path.join("handGestModel", "saved_model"),
+    "tflite": os.path.join("handGestModel", "model.tflite"),
+    "onnx": os.path.join("handGestModel", "model.onnx"),
+}
+
+def createNormalizationTable():
+    #The SSD MobileNet feature extractor expects the pixels scaled to [-1, 1], stored as a table for the 256 pixel values
+    return (numpy.arange(256, dtype=numpy.float32) - 127.5) / 127.5
+
+class TensorFlowBackend:
+    name = "tensorflow"
+
+    @staticmethod
+    def loadModules():
+        #TensorFlow is only imported if this backend is used
+        import tensorflow as tf
+        return tf
+
+    def __init__(self, modelPath, inputSize, numThreads=0):
+        tf = self.loadModules()
+        if numThreads:
+            tf.config.threading.set_intra_op_parallelism_threads(numThreads)
+        self.model = tf.saved_model.load(modelPath)
+        #The model is always called with the same input shape, so a single concrete function is used
+        self.detectFunction = tf.function(self.model.__call__,
+                                          input_signature=[tf.TensorSpec([1, inputSize[1], inputSize[0], 3], tf.uint8)])
+
+    def detect(self, inputArray):
+        #Returns the boxes, the class ids and the scores of the detections for the single image in the batch
+        detections = self.detectFunction(inputArray)
+        return (detections['detection_boxes'][0].numpy(),
+                detections['detection_classes'][0].numpy(),
+                detections['detection_scores'][0].numpy())
+
+class TFLiteBackend:
+    name = "tflite"
+
+    @staticmethod
+    def loadModules():
+        #The small tflite runtime is preferred, the full TensorFlow is only the fallback
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        return Interpreter
+
+    def __init__(self, modelPath, inputSize, numThreads=0):
+        Interpreter = self.loadModules()
+        self.interpreter = Interpreter(model_path=modelPath, num_threads=numThreads or None)
+
+        #Fixing the input shape to the prepared frames
+        inputDetails = self.interpreter.get_input_details()[0]
+        self.inputIndex = inputDetails['index']
+        inputShape = [1, inputSize[1], inputSize[0], 3]
+        if list(inputDetails['shape']) != inputShape:
+            self.interpreter.resize_tensor_input(self.inputIndex, inputShape)
+        self.interpreter.allocate_tensors()
+
+        #Lookup table from the pixel values to the input of the model, quantized for the int8 and uint8 models
+        inputDtype = inputDetails['dtype']
+        table = createNormalizationTable()
+        scale, zeroPoint = inputDetails['quantization']
+        if inputDtype != numpy.float32 and scale != 0:
+            limits = numpy.iinfo(inputDtype)
+            table = numpy.clip(numpy.round(table / scale + zeroPoint), limits.min, limits.max)
+        self.inputTable = table.astype(inputDtype)
+        self.inputBuffer = numpy.empty(inputShape, dtype=inputDtype)
+
+        #The detection postprocess operation returns the boxes, the classes, the scores and the count in changing order
+        self.outputDetails = self.interpreter.get_output_details()
+        self.boxesIndex = None
+        self.countIndex = None
+        self.otherIndexes = []
+        for details in self.outputDetails:
+            if details['shape'][-1] == 4:
+                self.boxesIndex = details['index']
+            elif len(details['shape']) == 1:
+                self.countIndex = details['index']
+            else:
+                self.otherIndexes.append(details['index'])
+
+    def detect(self, inputArray):
+        numpy.take(self.inputTable, inputArray, out=self.inputBuffer)
+        self.interpreter.set_tensor(self.inputIndex, self.inputBuffer)
+        self.interpreter.invoke()
+
+        boxes = self.interpreter.get_tensor(self.boxesIndex)[0]
+        first, second = [self.interpreter.get_tensor(index)[0] for index in self.otherIndexes]
+        #The class ids are whole numbers, the scores are not
+        if numpy.all(first == numpy.floor(first)) and not numpy.all(second == numpy.floor(second)):
+            classes, scores = first, second
+        else:
+            classes, scores = second, first
+        if self.countIndex is not None:
+            count = int(self.interpreter.get_tensor(self.countIndex)[0])
+            boxes, classes, scores = boxes[:count], classes[:count], scores[:count]
+
+        #The postprocess operation counts the classes from 0, the saved model from 1
+        return boxes, classes + 1, scores
+
+class ONNXBackend:
+    name = "onnx"
+
+    @staticmethod
+    def loadModules():
+        #onnxruntime is used if it is installed, otherwise the OpenCV DNN module runs the model
+        try:
+            import onnxruntime
+            return onnxruntime
+        except ImportError:
+            return None
+
+    def __init__(self, modelPath, inputSize, numThreads=0):
+        onnxruntime = self.loadModules()
+        if onnxruntime is not None:
+            options = onnxruntime.SessionOptions()
+            if numThreads:
+                options.intra_op_num_threads = numThreads
+            self.session = onnxruntime.InferenceSession(modelPath, options, providers=["CPUExecutionProvider"])
+            self.inputName = self.session.get_inputs()[0].name
+            self.outputNames = [output.name for output in self.session.get_outputs()]
+            self.net = None
+        else:
+            self.session = None
+            self.net = cv2.dnn.readNetFromONNX(modelPath)
+            if numThreads:
+                cv2.setNumThreads(numThreads)
+            self.outputNames = self.net.getUnconnectedOutLayersNames()
+
+    def detect(self, inputArray):
+        if self.session is not None:
+            outputs = self.session.run(None, {self.inputName: inputArray})
+        else:
+            self.net.setInput(inputArray)
+            outputs = self.net.forward(self.outputNames)
+
+        #The outputs keep the names of the saved model they were converted from
+        namedOutputs = dict(zip(self.outputNames, outputs))
+        def findOutput(name):
+            for outputName, output in namedOutputs.items():
+                if name in outputName:
+                    return output[0]
+            raise KeyError("Missing model output: " + name)
+        return findOutput("detection_boxes"), findOutput("detection_classes"), findOutput("detection_scores")
+
+inferenceBackends = {
+    "tensorflow": TensorFlowBackend,
+    "tflite": TFLiteBackend,
+    "onnx": ONNXBackend,
+}
+
+def getInferenceBackendClass(settings):
+    #Choosing the inference backend based on the settings, the TensorFlow saved model is the default
+    backendName = settings.get("inferenceBackend", "tensorflow")
+    if backendName not in inferenceBackends:
+        raise ValueError("Unknown inference backend: " + str(backendName))
+    return inferenceBackends[backendName]
+
+def createInferenceBackend(settings, inputSize):
+    backendName = getInferenceBackendClass(settings).name
+    modelPath = settings.get("inferenceModelPath") or defaultModelPaths[backendName]
+    return inferenceBackends[backendName](modelPath, inputSize, settings.get("inferenceThreads", 0))
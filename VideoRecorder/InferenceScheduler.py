@@ -0,0 +1,108 @@
+import math
+import threading
+from collections import deque
+
+import numpy
+
+class InferenceScheduler:
+    def __init__(self, targetFps, maxGestureLatency=0.5, minInterval=1, maxInterval=10, period=1.0, tolerance=0.1, window=100):
+        #Chooses every how many frames the model runs (the frame interval), so the recording holds the target fps
+        #and a gesture is recognized in at most maxGestureLatency seconds, the decision is made every period seconds
+        #The latency is a hard limit, inside it the model runs as often as the target fps allows
+        self.targetFps = targetFps
+        self.maxGestureLatency = maxGestureLatency
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.period = period
+        self.tolerance = tolerance
+        self.interval = minInterval
+
+        #Measurements, the latencies come from the inference worker thread
+        self.lock = threading.Lock()
+        self.inferenceLatencies = deque(maxlen=window)
+        self.inferenceLatencyEwma = None
+        self.frameIntervalEwma = None
+        self.lastFrameTime = None
+        self.lastDecisionTime = None
+        self.newInferences = 0
+
+        #An interval where the fps was too low is not tried again for the fps headroom until its backoff time passes
+        #The backoff doubles every time, so the interval does not swing around the fastest one the machine can hold
+        self.blockedIntervals = {}
+        self.decisions = deque(maxlen=200)
+
+    def recordInference(self, latency):
+        with self.lock:
+            self.inferenceLatencies.append(latency)
+            self.inferenceLatencyEwma = latency if self.inferenceLatencyEwma is None else 0.9 * self.inferenceLatencyEwma + 0.1 * latency
+            self.newInferences += 1
+
+    def recordFrame(self, timestamp):
+        #Called with the capture time of every written frame
+        if self.lastFrameTime is not None:
+            frameInterval = timestamp - self.lastFrameTime
+            self.frameIntervalEwma = frameInterval if self.frameIntervalEwma is None else 0.95 * self.frameIntervalEwma + 0.05 * frameInterval
+        self.lastFrameTime = timestamp
+
+    def stats(self):
+        with self.lock:
+            latencies = numpy.array(self.inferenceLatencies)
+            latencyEwma = self.inferenceLatencyEwma
+        fps = 1. / self.frameIntervalEwma if self.frameIntervalEwma else 0.0
+        stats = {"interval": self.interval, "fps": fps, "targetFps": self.targetFps,
+                 "inferenceLatencyEwma": latencyEwma, "inferenceLatencyP50": None, "inferenceLatencyP95": None,
+                 "gestureLatency": None, "maxGestureLatency": self.maxGestureLatency}
+        if len(latencies) > 0:
+            stats["inferenceLatencyP50"] = float(numpy.percentile(latencies, 50))
+            stats["inferenceLatencyP95"] = float(numpy.percentile(latencies, 95))
+            if fps > 0:
+                #The worst case: the gesture appears right after a frame was sent, then waits for the next one and its inference
+                stats["gestureLatency"] = self.interval / fps + stats["inferenceLatencyP95"]
+        return stats
+
+    def decide(self, timestamp, newInterval, reason, stats):
+        self.decisions.append({"time": timestamp, "from": self.interval, "to": newInterval, "reason": reason,
+                               "fps": stats["fps"], "gestureLatency": stats["gestureLatency"],
+                               "inferenceLatencyP95": stats["inferenceLatencyP95"]})
+        self.interval = newInterval
+
+    def update(self, timestamp):
+        #Returns the frame interval of the inference, it changes at most once in a period
+        if self.lastDecisionTime is None:
+            self.lastDecisionTime = timestamp
+        if timestamp - self.lastDecisionTime < self.period:
+            return self.interval
+        self.lastDecisionTime = timestamp
+
+        #Without inferences in the last period (the AI is turned off) there is nothing to adjust
+        with self.lock:
+            newInferences = self.newInferences
+            self.newInferences = 0
+        stats = self.stats()
+        if newInferences == 0 or stats["fps"] <= 0:
+            return self.interval
+
+        #The worker cannot run more often than its latency allows, sending frames faster only drops them
+        capacityInterval = max(self.minInterval, int(math.ceil(stats["inferenceLatencyP50"] * stats["fps"])))
+        #The largest interval where interval / fps + the p95 inference latency is still within maxGestureLatency
+        latencyInterval = int(math.floor((self.maxGestureLatency - stats["inferenceLatencyP95"]) * stats["fps"]))
+        latencyInterval = min(max(latencyInterval, self.minInterval), self.maxInterval)
+        fpsTooLow = stats["fps"] < self.targetFps * (1 - self.tolerance)
+
+        if fpsTooLow and self.interval < latencyInterval:
+            #The model runs less often to give the time to the recording, but never above the latency limit
+            backoff = self.blockedIntervals.get(self.interval, (0, self.period * 15))[1] * 2
+            self.blockedIntervals[self.interval] = (timestamp + backoff, backoff)
+            self.decide(timestamp, self.interval + 1, "fps below target", stats)
+        elif self.interval > capacityInterval and self.interval > latencyInterval:
+            #The latency limit has priority over the fps, an interval below the capacity would not make it faster
+            self.decide(timestamp, self.interval - 1, "gesture latency above maximum", stats)
+        elif self.interval > capacityInterval and not fpsTooLow:
+            lowerInterval = self.interval - 1
+            if timestamp >= self.blockedIntervals.get(lowerInterval, (0, 0))[0]:
+                self.decide(timestamp, lowerInterval, "fps headroom", stats)
+        return self.interval
+
+    def report(self):
+        #The current measurements and the recent decisions, for tuning the parameters per deployment
+        return {"stats": self.stats(), "decisions": list(self.decisions)}
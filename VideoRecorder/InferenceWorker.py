@@ -0,0 +1,69 @@
+import threading
+import time
+import traceback
+
+from VideoRecorder.FramePipeline import FrameQueue, PIPELINE_END
+
+class InferenceResult:
+    def __init__(self, command, boundingBox, timestamp):
+        #The prediction with the capture time of the frame it was made on
+        self.command = command
+        self.boundingBox = boundingBox
+        self.timestamp = timestamp
+
+class InferenceWorker(threading.Thread):
+    def __init__(self, predict, onLatency=None):
+        super().__init__(name="InferenceWorker", daemon=True)
+        #The predict function gets a frame and returns a (command, boundingBox) pair
+        #onLatency is called with the duration of every prediction in seconds
+        self.predict = predict
+        self.onLatency = onLatency
+        #Only the most recent frame is kept, older frames are dropped while the model is busy
+        self.frameSlot = FrameQueue(1, "dropOldest")
+        self.resultLock = threading.Lock()
+        self.latestResult = None
+        self.inferenceCounter = 0
+        #A failed prediction is counted and the worker goes on, only the first failure is printed
+        self.failureCounter = 0
+
+    def submit(self, frame, timestamp):
+        #Never blocks, the caller should pass a frame which is not modified afterwards
+        self.frameSlot.put((frame, timestamp))
+
+    def takeResult(self, frameTimestamp=None):
+        #Returns the newest result which was not taken yet, or None
+        #frameTimestamp is the capture time of the frame the result is applied to, only the replay of a session needs it
+        with self.resultLock:
+            result = self.latestResult
+            self.latestResult = None
+        return result
+
+    def droppedFrames(self):
+        return self.frameSlot.droppedCounter
+
+    def failedPredictions(self):
+        return self.failureCounter
+
+    def stop(self):
+        self.frameSlot.putEnd()
+        self.join()
+
+    def run(self):
+        while True:
+            item = self.frameSlot.get()
+            if item is PIPELINE_END:
+                break
+            frame, timestamp = item
+            startTime = time.perf_counter()
+            try:
+                command, boundingBox = self.predict(frame)
+            except Exception:
+                if self.failureCounter == 0:
+                    traceback.print_exc()
+                self.failureCounter += 1
+                continue
+            if self.onLatency is not None:
+                self.onLatency(time.perf_counter() - startTime)
+            self.inferenceCounter += 1
+            with self.resultLock:
+                self.latestResult = InferenceResult(command, boundingBox, timestamp)
@@ -0,0 +1,188 @@
+import bisect
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy
+
+class StageProfiler:
+    #The upper limits of the latency histogram buckets in seconds, from 10 microseconds to 10 seconds
+    bucketLimits = list(numpy.geomspace(1e-5, 10, 61))
+
+    def __init__(self, enabled=False, maxEvents=200000):
+        #Measures the time of the stages of the recording, counts the dropped and repeated frames and samples the queue depths
+        #When it is disabled begin returns 0 and end returns at once, so the calls can stay in the hot path
+        self.enabled = enabled
+        self.maxEvents = maxEvents
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.startTime = time.perf_counter_ns()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        #Every measurement and gauge sample for the traces, the oldest ones are dropped on a long recording
+        self.events = deque(maxlen=self.maxEvents)
+        self.gaugeEvents = deque(maxlen=self.maxEvents)
+        #Only set on a snapshot, which is not measuring anymore
+        self.endTime = None
+        self.threadNames = None
+
+    def snapshot(self):
+        #A copy of the measurements, which can be exported while this profiler measures the next recording
+        copy = StageProfiler(self.enabled, self.maxEvents)
+        with self.lock:
+            copy.startTime = self.startTime
+            copy.stages = {name: dict(stats, histogram=list(stats["histogram"])) for name, stats in self.stages.items()}
+            copy.counters = dict(self.counters)
+            copy.gauges = {name: dict(stats) for name, stats in self.gauges.items()}
+            copy.events = deque(self.events, maxlen=self.maxEvents)
+            copy.gaugeEvents = deque(self.gaugeEvents, maxlen=self.maxEvents)
+        copy.endTime = time.perf_counter_ns()
+        #The threads of the recording might be finished by the time the trace is written
+        copy.threadNames = {thread.ident: thread.name for thread in threading.enumerate()}
+        return copy
+
+    def begin(self):
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def end(self, stage, startTime):
+        #Recording the time since begin was called for the stage
+        if not self.enabled:
+            return
+        endTime = time.perf_counter_ns()
+        duration = (endTime - startTime) / 1e9
+        bucket = bisect.bisect_left(self.bucketLimits, duration)
+        with self.lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0, "histogram": [0] * (len(self.bucketLimits) + 1)}
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["last"] = duration
+            stats["max"] = max(stats["max"], duration)
+            stats["histogram"][bucket] += 1
+            self.events.append((stage, threading.get_ident(), startTime - self.startTime, endTime - startTime))
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def setCounter(self, name, value):
+        #For the counters which are kept by the parts of the recorder themselves
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = value
+
+    def gauge(self, name, value):
+        #Sampling a changing value, like the depth of a queue
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.gauges.get(name)
+            if stats is None:
+                stats = self.gauges[name] = {"last": value, "max": value, "total": 0, "count": 0}
+            stats["last"] = value
+            stats["max"] = max(stats["max"], value)
+            stats["total"] += value
+            stats["count"] += 1
+            self.gaugeEvents.append((name, time.perf_counter_ns() - self.startTime, value))
+
+    def percentile(self, histogram, count, ratio):
+        #The upper limit of the bucket where the given ratio of the measurements is reached
+        target = ratio * count
+        cumulative = 0
+        for index, bucketCount in enumerate(histogram):
+            cumulative += bucketCount
+            if cumulative >= target:
+                return self.bucketLimits[min(index, len(self.bucketLimits) - 1)]
+        return self.bucketLimits[-1]
+
+    def summary(self):
+        #The statistics of the stages in milliseconds, the counters and the gauges
+        with self.lock:
+            stages = {name: dict(stats, histogram=list(stats["histogram"])) for name, stats in self.stages.items()}
+            counters = dict(self.counters)
+            gauges = {name: dict(stats) for name, stats in self.gauges.items()}
+        endTime = self.endTime if self.endTime is not None else time.perf_counter_ns()
+        result = {"duration": (endTime - self.startTime) / 1e9, "stages": {}, "counters": counters, "gauges": {}}
+        for name, stats in stages.items():
+            result["stages"][name] = {
+                "count": stats["count"],
+                "meanMs": stats["total"] / stats["count"] * 1000,
+                "p50Ms": self.percentile(stats["histogram"], stats["count"], 0.5) * 1000,
+                "p95Ms": self.percentile(stats["histogram"], stats["count"], 0.95) * 1000,
+                "p99Ms": self.percentile(stats["histogram"], stats["count"], 0.99) * 1000,
+                "maxMs": stats["max"] * 1000,
+                "histogram": stats["histogram"],
+            }
+        for name, stats in gauges.items():
+            result["gauges"][name] = {"last": stats["last"], "max": stats["max"], "mean": stats["total"] / float(stats["count"])}
+        result["histogramLimitsMs"] = [limit * 1000 for limit in self.bucketLimits]
+        return result
+
+    def exportJSON(self, path):
+        with open(path, "w") as outfile:
+            json.dump(self.summary(), outfile, indent=1)
+
+    def exportCSV(self, path):
+        #One row for every measurement and gauge sample, the times are in milliseconds from the start
+        with self.lock:
+            events = list(self.events)
+            gaugeEvents = list(self.gaugeEvents)
+        with open(path, "w", newline="") as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(["type", "name", "thread", "startMs", "durationMs", "value"])
+            for stage, thread, start, duration in events:
+                writer.writerow(["stage", stage, thread, start / 1e6, duration / 1e6, ""])
+            for name, start, value in gaugeEvents:
+                writer.writerow(["gauge", name, "", start / 1e6, "", value])
+
+    def exportChromeTrace(self, path):
+        #The trace can be opened in chrome://tracing or Perfetto, the times are in microseconds
+        with self.lock:
+            events = list(self.events)
+            gaugeEvents = list(self.gaugeEvents)
+        threadNames = self.threadNames or {thread.ident: thread.name for thread in threading.enumerate()}
+        traceEvents = []
+        for thread in set(event[1] for event in events):
+            traceEvents.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": thread,
+                                "args": {"name": threadNames.get(thread, str(thread))}})
+        for stage, thread, start, duration in events:
+            traceEvents.append({"name": stage, "ph": "X", "pid": 1, "tid": thread, "ts": start / 1e3, "dur": duration / 1e3})
+        for name, start, value in gaugeEvents:
+            traceEvents.append({"name": name, "ph": "C", "pid": 1, "ts": start / 1e3, "args": {name: value}})
+        with open(path, "w") as outfile:
+            json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, outfile)
+
+    def export(self, basePath):
+        #Writing all of the formats next to each other, returns the written paths
+        paths = [basePath + "_stats.json", basePath + "_trace.csv", basePath + "_chrome_trace.json"]
+        self.exportJSON(paths[0])
+        self.exportCSV(paths[1])
+        self.exportChromeTrace(paths[2])
+        return paths
+
+    def drawHud(self, frame):
+        #Writing the last and the mean time of every stage and the counters on the frame, in place
+        if not self.enabled:
+            return frame
+        with self.lock:
+            lines = [name + ": " + "%.1f" % (stats["last"] * 1000) + " ms (mean " + "%.1f" % (stats["total"] / stats["count"] * 1000) + ")"
+                     for name, stats in self.stages.items()]
+            lines += [name + ": " + str(value) for name, value in self.counters.items()]
+            lines += [name + ": " + str(stats["last"]) for name, stats in self.gauges.items()]
+        scale = max(frame.shape[0] / 960.0, 0.3)
+        lineHeight = int(30 * scale) + 2
+        for index, line in enumerate(lines):
+            position = (5, (index + 1) * lineHeight)
+            cv2.putText(frame, line, position, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(frame, line, position, cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 255, 0), 1, cv2.LINE_AA)
+        return frame
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import numpy
+
+from VideoRecorder.InferenceBackends import createInferenceBackend, getInferenceBackendClass
+
+class ModelLoader(threading.Thread):
+    #The states of the loading, in order
+    states = ("idle", "importing", "loading", "warmingUp", "ready", "failed")
+
+    def __init__(self, getSettings, inputSize, warmUpRuns=2):
+        super().__init__(name="ModelLoader", daemon=True)
+        #Imports the inference backend, loads the model and runs a few inferences on an empty image in the background
+        #The first real inference is then as fast as the rest, the backend is only available when everything finished
+        #getSettings returns the current settings, they are read when the loading starts, since they can be replaced before
+        self.getSettings = getSettings
+        self.inputSize = inputSize
+        self.warmUpRuns = warmUpRuns
+        self.state = "idle"
+        self.progress = 0.0
+        self.error = None
+        self.backend = None
+        self.readyEvent = threading.Event()
+        self.loadLock = threading.Lock()
+        #The time of every loading step in seconds
+        self.timings = {}
+
+    def load(self):
+        #Starts the loading if it was not started yet, can be called any number of times
+        with self.loadLock:
+            if self.state == "idle":
+                self.state = "importing"
+                self.start()
+
+    def isReady(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        #Blocks until the loading finished, returns the backend or None if it failed or the time ran out
+        self.readyEvent.wait(timeout)
+        return self.backend
+
+    def status(self):
+        return {"state": self.state, "progress": self.progress, "error": self.error, "timings": dict(self.timings)}
+
+    def run(self):
+        startTime = time.perf_counter()
+        settings = self.getSettings()
+        try:
+            stepTime = time.perf_counter()
+            backendClass = getInferenceBackendClass(settings)
+            backendClass.loadModules()
+            self.timings["imports"] = time.perf_counter() - stepTime
+            self.state = "loading"
+            self.progress = 0.3
+
+            stepTime = time.perf_counter()
+            backend = createInferenceBackend(settings, self.inputSize)
+            self.timings["modelLoad"] = time.perf_counter() - stepTime
+            self.state = "warmingUp"
+            self.progress = 0.8
+
+            #The first calls build the graph and allocate the buffers of the backend
+            stepTime = time.perf_counter()
+            warmUpInput = numpy.zeros((1, self.inputSize[1], self.inputSize[0], 3), dtype=numpy.uint8)
+            for _ in range(self.warmUpRuns):
+                backend.detect(warmUpInput)
+            self.timings["warmUp"] = time.perf_counter() - stepTime
+            self.timings["total"] = time.perf_counter() - startTime
+
+            self.backend = backend
+            self.progress = 1.0
+            self.state = "ready"
+            print("Model loading report: ", self.timings)
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print("Loading the model failed: ", e)
+        finally:
+            self.readyEvent.set()
@@ -0,0 +1,47 @@
+import cv2
+import numpy
+
+class MotionGate:
+    def __init__(self, threshold=0.01, refreshInterval=2.0, pixelThreshold=25, size=(64, 48)):
+        #Decides on a small grayscale copy of the frame whether the scene changed enough to run the model again
+        #threshold is the ratio of the pixels which changed more than pixelThreshold since the last inference
+        #After refreshInterval seconds the model runs even on a static scene
+        self.threshold = threshold
+        self.refreshInterval = refreshInterval
+        self.pixelThreshold = pixelThreshold
+        self.small = numpy.empty((size[1], size[0], 3), dtype=numpy.uint8)
+        self.gray = numpy.empty((size[1], size[0]), dtype=numpy.uint8)
+        self.reference = numpy.empty_like(self.gray)
+        self.difference = numpy.empty_like(self.gray)
+        self.lastPassTime = None
+        self.checkedFrames = 0
+        self.skippedInferences = 0
+        self.lastMotion = 0.0
+
+    def reset(self):
+        self.lastPassTime = None
+
+    def check(self, frame, timestamp):
+        #Returns True if the frame should be sent to the model
+        #The frame is compared to the last frame which passed, so a slow movement also adds up
+        self.checkedFrames += 1
+        cv2.resize(frame, (self.small.shape[1], self.small.shape[0]), dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        if self.lastPassTime is None:
+            return self.passFrame(timestamp)
+
+        cv2.absdiff(self.gray, self.reference, dst=self.difference)
+        self.lastMotion = cv2.countNonZero(cv2.threshold(self.difference, self.pixelThreshold, 255, cv2.THRESH_BINARY)[1]) / float(self.difference.size)
+        if self.lastMotion >= self.threshold or timestamp - self.lastPassTime >= self.refreshInterval:
+            return self.passFrame(timestamp)
+        self.skippedInferences += 1
+        return False
+
+    def passFrame(self, timestamp):
+        numpy.copyto(self.reference, self.gray)
+        self.lastPassTime = timestamp
+        return True
+
+    def report(self):
+        return {"checkedFrames": self.checkedFrames, "skippedInferences": self.skippedInferences,
+                "skippedRatio": self.skippedInferences / float(self.checkedFrames) if self.checkedFrames else 0.0}
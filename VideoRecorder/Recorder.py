@@ -1,12 +1,26 @@
 import os
 import cv2
-import pyaudio
-import wave
-import numpy
-import tensorflow as tf
-import time
-from moviepy.editor import VideoFileClip, AudioFileClip
 from datetime import datetime
+import queue
+import threading
+
+from VideoRecorder.FramePipeline import FrameQueue, PipelineStage, PipelineFrame, PIPELINE_END
+from VideoRecorder.InferenceWorker import InferenceWorker
+from VideoRecorder.AudioWriter import AudioWriter
+from VideoRecorder.CaptureSources import createAudioSource, createVideoSource
+from VideoRecorder.TimestampSync import CaptureClock, FrameTimeline
+from VideoRecorder.InferenceScheduler import InferenceScheduler
+from VideoRecorder.FFmpegTools import getFFmpegPath
+from VideoRecorder.VideoEncoders import createVideoEncoder
+from VideoRecorder.GestureDetection import DetectionDecoder, ModelInputPreparer, gestureClasses, readModelInputSize
+from VideoRecorder.ModelLoader import ModelLoader
+from VideoRecorder.DrawingOverlay import DrawingOverlay
+from VideoRecorder.FingertipTracker import FingertipTracker
+from VideoRecorder.MotionGate import MotionGate
+from VideoRecorder.Instrumentation import StageProfiler
+from VideoRecorder.SessionArchive import SessionCapture, SessionReplay
+from VideoRecorder.SegmentedRecording import RecordingSegment, SegmentFinalizer, mergeSegments
+from VideoRecorder.FinalizationQueue import FinalizationJob
 
 class Recorder:
     def __init__(self, settings):
@@ -17,295 +31,719 @@ class Recorder:
         self.settings = settings
         self.videoWriter = None
         self.videoFileName = ""
-        self.fpsTimeRemainder = 0
-        self.frameRepeatedCounter = 0
+        #The recording is written in segments of segmentSeconds, the finished ones are muxed in the background
+        #At stop only the last segment is muxed and the segments are joined, a crash loses at most the last segment
+        self.recordingName = ""
+        self.segmentSeconds = 0
+        self.currentSegment = None
+        self.segmentFinalizer = None
+        #Every frame and audio chunk is stamped on the capture clock, the timing of the output is built from these stamps
+        self.captureClock = None
+        self.frameTimeline = None
+        self.syncReport = None
         #Variable to store the last calculated frame, so taking a screenshot can have it's own function
         self.lastVideoFrame = None
+        #Measuring the stages of the recording, exported next to the recording at stop if it is enabled
+        self.profiler = StageProfiler(self.settings.get("instrumentation", False))
+        #The inputs and outputs of a session can be saved into an archive, and an archive can be replayed instead of the devices
+        self.sessionCapture = None
+        self.sessionReplay = None
 
         #Setting up the variables for the voice recording
         self.audioFrameRate = 30000
         self.audioNumberOfChannels = 1
         self.audioVolumeLevel = 1.0
-        self.audioCaptureDevice = None
-        self.audioStream = None
-        self.audioFrames = []
+        self.audioCapture = None
+        self.audioWriter = None
         self.audioError = False
 
-        #Loading in the MobileNet model and variables for using it
-        self.model = tf.saved_model.load("handGestModel\saved_model")
+        #The frames are resized to the fixed input size of the model before inference, instead of inside the graph
+        self.modelInputSize = readModelInputSize(os.path.join("handGestModel", "pipeline.config"))
+        self.modelInput = ModelInputPreparer(self.modelInputSize)
+
+        #The MobileNet model is loaded in the background with the inference backend chosen in the settings, when the AI is first used
+        self.modelLoader = ModelLoader(lambda: self.settings, self.modelInputSize)
+        if self.settings.get("preloadModel", False):
+            self.modelLoader.load()
         self.drawPixel = []
         self.lineTickness = 2
         self.drawNewLine = True
-        self.lastDrawAppend = time.time()
+        self.drawingOverlay = DrawingOverlay((255, 255, 255), self.lineTickness)
+        #The capture time of the last drawn point, so a replay starts the new lines on the same frames at any speed
+        self.lastDrawAppend = 0
+        #While drawing the fingertip is tracked on every frame, the detector only re-anchors it every trackerAnchorInterval frames
+        #Both are set from the settings when the recording is started
+        self.fingertipTracker = None
+        self.trackerAnchorInterval = 5
+        #The model is skipped on frames where nothing moved since the last inference
+        self.motionGate = None
         self.frameTimeMax = 1
         self.frameTimer = self.frameTimeMax
         self.predictTreshold = 0.95
         self.currentPrediction = None
         self.predictConfidenceCounterMax = 2
         self.predictConfidenceCounter = self.predictConfidenceCounterMax
-        self.predictFrameWaitCounterMax = 60
-        self.predictFrameWaitCounter = self.predictFrameWaitCounterMax
-        self.classes = [{'id':1, 'name':"draw"},{'id':2, 'name':"clear"},{'id':3, 'name':"mute"},{'id':4, 'name':"voicedown"},{'id':5, 'name':"voiceup"}]
+        #The debouncing is based on the capture time of the predicted frames, in seconds
+        self.predictConfidenceWindow = 1.0
+        self.lastPredictionTime = 0
+        self.predictWaitTime = 2.0
+        self.predictWaitUntil = 0
+        self.inferenceWorker = None
+        #The scheduler chooses frameTimeMax from the measured inference latency and frame rate
+        self.inferenceScheduler = None
+        self.inferenceNeedsModel = True
+        self.classes = gestureClasses
+        self.detectionDecoder = DetectionDecoder(self.classes, self.predictTreshold)
+
+        #Variables for the pipelined mode, where capture, inference, overlay and encoding run on separate threads
+        self.pipelineMode = False
+        self.pipelineUseAI = False
+        self.pipelineStages = []
+        self.pipelineStopEvent = None
+        self.previewQueue = None
+        self.commandQueue = None
+        self.pipelineQueues = {}
 
     def setSettings(self, settings):
         #Utility function to change the settings of the object
         self.settings = settings
 
     def startRecorder(self):
-        #Creating the capturing device for the visual part of the video
+        self.profiler.enabled = self.settings.get("instrumentation", False)
+        self.profiler.reset()
+
+        #Replaying a captured session instead of the devices, so two runs get exactly the same input
+        self.sessionReplay = None
+        if self.settings.get("sessionReplayPath"):
+            try:
+                self.sessionReplay = SessionReplay(self.settings["sessionReplayPath"], self.audioNumberOfChannels,
+                                                   self.settings.get("audioBufferSeconds", 4.0), self.settings.get("replayPaced", False),
+                                                   self.settings.get("replayInference", "recorded") == "recorded")
+            except (OSError, ValueError, KeyError):
+                return 1
+
+        #Creating the capturing device for the visual part of the video, the camera or a test source from the settings
         try:
-            self.captureDevice = cv2.VideoCapture(self.settings["cameraChoice"])
+            if self.sessionReplay is not None:
+                self.captureDevice = self.sessionReplay.videoSource
+            else:
+                self.captureDevice = createVideoSource(self.settings)
         except Exception:
-            self.captureDevice = None
+            self.releaseFailedStart()
             return 1
         self.videoFrameRate = self.captureDevice.get(cv2.CAP_PROP_FPS)
 
         #Creating the visual writer for the video with the name plus the current date
         currentTime = datetime.now().strftime("%d-%m-%Y_%H-%M-%S")
-        self.videoFileName = self.settings["savePath"] + "/Recording-" + currentTime + ".mp4"
-        codec = cv2.VideoWriter_fourcc(*"mp4v")
+        self.recordingName = "Recording-" + currentTime
+        self.videoFileName = self.settings["savePath"] + "/" + self.recordingName + ".mp4"
+        self.segmentSeconds = self.settings.get("segmentSeconds", 60)
+        self.currentSegment = self.createSegment(0)
+        #The previous recording might still be finalized with the same name, if it was started in the same second
+        nameCounter = 2
+        while os.path.exists(self.videoFileName) or os.path.exists(self.currentSegment.videoPath):
+            self.recordingName = "Recording-" + currentTime + "_" + str(nameCounter)
+            self.videoFileName = self.settings["savePath"] + "/" + self.recordingName + ".mp4"
+            self.currentSegment = self.createSegment(0)
+            nameCounter += 1
+        #The encoder backend is chosen in the settings
         try:
-            self.videoWriter = cv2.VideoWriter(self.settings["savePath"] + "/TempRecording.mp4", 
-                                            codec, self.captureDevice.get(cv2.CAP_PROP_FPS), 
-                                            (int(self.captureDevice.get(3)),
-                                                int(self.captureDevice.get(4))))
+            self.videoWriter = createVideoEncoder(self.settings, self.currentSegment.videoPath, 
+                                                  self.captureDevice.get(cv2.CAP_PROP_FPS), 
+                                                  (int(self.captureDevice.get(3)),
+                                                   int(self.captureDevice.get(4))))
         except Exception:
-            self.captureDevice = None
-            self.videoWriter = None
+            self.releaseFailedStart()
             return 2
         self.videoSize = (int(self.captureDevice.get(3)), int(self.captureDevice.get(4)))
-        
-        #Creating the audio recorder device
-        self.audioFrameRate = int(self.captureDevice.get(cv2.CAP_PROP_FPS))*1024
+        self.drawingOverlay.reset((self.videoSize[1], self.videoSize[0], 3))
+
+        #Saving the raw inputs and the outputs of the session, for replaying it later
+        self.sessionCapture = None
+        if self.settings.get("sessionCapture", False) and self.sessionReplay is None:
+            sessionPath = os.path.join(self.settings.get("sessionCapturePath") or self.settings["savePath"], "Session-" + currentTime)
+            try:
+                self.sessionCapture = SessionCapture(sessionPath, self.videoFrameRate, self.videoSize, self.settings)
+            except Exception:
+                self.releaseFailedStart()
+                return 2
+
+        #Creating the audio recorder device, it captures on its own thread at the native rate of the device
         try:
-            self.audioCaptureDevice = pyaudio.PyAudio()
-            self.audioStream = self.audioCaptureDevice.open(format=pyaudio.paInt16, 
-                                                            channels=self.audioNumberOfChannels, 
-                                                            rate=self.audioFrameRate, input=True, 
-                                                            frames_per_buffer=1024, 
-                                                            input_device_index=self.settings["audioChoice"])
+            if self.sessionReplay is not None:
+                self.audioCapture = self.sessionReplay.audioSource
+            else:
+                self.audioCapture = createAudioSource(self.settings, self.audioNumberOfChannels,
+                                                      bufferSeconds=self.settings.get("audioBufferSeconds", 4.0))
         except Exception:
-            self.captureDevice = None
-            self.videoWriter = None
-            self.audioCaptureDevice = None
-            self.audioStream = None
+            self.audioCapture = None
+            self.releaseFailedStart()
             return 3
+        self.audioFrameRate = self.audioCapture.frameRate
+
+        #Creating the audio file, which is written continuously during the recording
+        try:
+            self.audioWriter = AudioWriter(self.currentSegment.audioPath, self.audioCapture.ringBuffer,
+                                           self.audioNumberOfChannels, self.audioCapture.sampleWidth,
+                                           self.audioFrameRate, volumeLevel=self.audioVolumeLevel, profiler=self.profiler,
+                                           rawPath=self.sessionCapture.audioPath if self.sessionCapture is not None else None)
+        except Exception:
+            self.audioWriter = None
+            self.releaseFailedStart()
+            return 2
+
+        #Starting the capture clock right before the capture itself
+        self.captureClock = CaptureClock()
+        self.frameTimeline = self.currentSegment.timeline
+        if self.segmentSeconds > 0:
+            self.segmentFinalizer = SegmentFinalizer(getFFmpegPath(self.settings), self.audioFrameRate, self.audioNumberOfChannels)
+            self.segmentFinalizer.start()
+        self.audioWriter.start()
+        self.audioCapture.start()
+
+        #Starting the inference worker, so the model never blocks the recording
+        self.inferenceScheduler = InferenceScheduler(self.settings.get("inferenceTargetFps") or self.videoFrameRate,
+                                                     maxGestureLatency=self.settings.get("maxGestureLatency", 0.5),
+                                                     minInterval=self.settings.get("inferenceMinInterval", 1),
+                                                     maxInterval=self.settings.get("inferenceMaxInterval", 10))
+        self.frameTimeMax = self.inferenceScheduler.interval
+        self.frameTimer = self.frameTimeMax
+        #A replay can give back the recorded model outputs instead of running the model
+        self.inferenceWorker = self.sessionReplay.createInferenceWorker() if self.sessionReplay is not None else None
+        self.inferenceNeedsModel = self.inferenceWorker is None
+        if self.inferenceWorker is None:
+            self.inferenceWorker = InferenceWorker(self.processFrame, self.inferenceScheduler.recordInference)
+        if self.settings.get("motionGateEnabled", True):
+            self.motionGate = MotionGate(self.settings.get("motionThreshold", 0.01), self.settings.get("motionRefreshInterval", 2.0))
+        else:
+            self.motionGate = None
+        if self.settings.get("trackerEnabled", True):
+            self.fingertipTracker = FingertipTracker(self.settings.get("trackerMaxAge", 0.6))
+        else:
+            self.fingertipTracker = None
+        self.trackerAnchorInterval = self.settings.get("trackerAnchorInterval", 5)
+        self.inferenceWorker.start()
+
+        #Starting the separate threads for the stages of the recording if it is enabled
+        self.pipelineMode = self.settings.get("pipelineMode", False)
+        if self.pipelineMode:
+            self.startPipeline()
         return 0
 
+    def releaseFailedStart(self):
+        #Closing what startRecorder already opened before it failed, so no device or ffmpeg process is left running
+        if self.audioCapture is not None:
+            self.audioCapture.close()
+            self.audioCapture = None
+        if self.sessionCapture is not None:
+            self.sessionCapture.discard()
+            self.sessionCapture = None
+        if self.videoWriter is not None:
+            try:
+                self.videoWriter.release()
+            except OSError:
+                pass
+            self.videoWriter = None
+            #Nothing was recorded into the temp video yet
+            if os.path.exists(self.currentSegment.videoPath):
+                os.remove(self.currentSegment.videoPath)
+        if self.captureDevice is not None:
+            self.captureDevice.release()
+            self.captureDevice = None
+
+    def startPipeline(self):
+        #The stages are joined by bounded queues, so the slowest stage decides the fps, instead of the sum of all of them
+        #The inference stage is the inference worker, which always takes the newest frame from the overlay stage
+        queueSize = self.settings.get("pipelineQueueSize", 4)
+        self.pipelineStopEvent = threading.Event()
+        #Capture should never wait, when overlay falls behind the oldest frame is dropped, the timeline only sees the frames which are written
+        #An unpaced replay waits for the overlay instead, so every replayed frame is processed
+        capturePolicy = "block" if self.sessionReplay is not None and not self.settings.get("replayPaced", False) else "dropOldest"
+        captureQueue = FrameQueue(queueSize, capturePolicy, lambda dropped, kept: self.profiler.count("droppedCaptureFrames"))
+        encodeQueue = FrameQueue(queueSize, "block")
+        #The preview only needs the newest frame
+        self.previewQueue = FrameQueue(1, "dropOldest")
+        self.pipelineQueues = {"captureQueue": captureQueue, "encodeQueue": encodeQueue}
+        #The commands are not bound to frames, so they can never be dropped
+        self.commandQueue = queue.Queue()
+
+        self.pipelineStages = [
+            PipelineStage("CaptureStage", self.pipelineCapture, None, [captureQueue], self.pipelineStopEvent),
+            PipelineStage("OverlayStage", self.pipelineOverlay, captureQueue, [encodeQueue, self.previewQueue], self.pipelineStopEvent),
+            PipelineStage("EncodeStage", self.pipelineEncode, encodeQueue, [], self.pipelineStopEvent),
+        ]
+        for stage in self.pipelineStages:
+            stage.start()
+
+    def stopPipeline(self):
+        #Stopping the capture, the rest of the stages finish the frames which are already in the queues
+        if not self.pipelineStages:
+            return
+        self.pipelineStopEvent.set()
+        for stage in self.pipelineStages:
+            stage.join()
+        self.pipelineStages = []
+        self.pipelineStopEvent = None
+
+    def pipelineCapture(self, item):
+        #Capture stage, reading the video frame and stamping it, the audio is captured separately
+        startTime = self.profiler.begin()
+        ret, frame = self.captureDevice.read()
+        timestamp = self.frameTimestamp()
+        self.profiler.end("capture", startTime)
+        if not self.audioCapture.isActive():
+            raise OSError("The audio stream has stopped")
+        if not ret:
+            return None
+        if self.sessionCapture is not None:
+            self.sessionCapture.addFrame(frame, timestamp, self.pipelineUseAI)
+        return PipelineFrame(frame, timestamp)
+
+    def frameTimestamp(self):
+        #The capture time of the frame which was just read, a replayed frame keeps its recorded time
+        if getattr(self.captureDevice, "providesTimestamps", False):
+            return self.captureDevice.lastTimestamp
+        return self.captureClock.now()
+
+    def pipelineOverlay(self, item):
+        #Overlay stage, handling the predictions, drawing the lines and flipping the image
+        for name, frameQueue in self.pipelineQueues.items():
+            self.profiler.gauge(name, frameQueue.depth())
+        item.command = self.applyInference(item.frame, item.timestamp, self.pipelineUseAI)
+        if item.command is not None:
+            self.commandQueue.put(item.command)
+        item.frame = self.flipFrame(self.drawLines(item.frame))
+        self.lastVideoFrame = item.frame
+        return item
+
+    def pipelineEncode(self, item):
+        #Encode stage, writing the frame to the video file and stamping it on the timeline
+        self.writeFrame(item.frame, item.timestamp)
+        return item
+
+    def getPipelineFrame(self, useAI):
+        #Getting the newest processed frame and the oldest unhandled command from the pipeline
+        self.pipelineUseAI = useAI
+        for stage in self.pipelineStages:
+            if stage.error is not None:
+                #The UI stops the recording on a read error, whatever stopped the stage
+                print("The " + stage.name + " stopped with an error: ", repr(stage.error))
+                self.audioError = True
+                return None, "ReadError"
+
+        command = None
+        try:
+            command = self.commandQueue.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            item = self.previewQueue.get(timeout=1./self.videoFrameRate)
+        except queue.Empty:
+            return None, command
+        if item is PIPELINE_END:
+            return None, command
+        return item.frame, command
+
     def getCurrentFrame(self, useAI=False):
         #Checking if the recording has been started, if not return None, meanin the recording is not running
         if self.captureDevice is None:
             return None, None
-        command = None
-        boundingBox = None
-        startTime = time.time()
+        if self.pipelineMode:
+            return self.getPipelineFrame(useAI)
 
-        #Getting the video and audio frames and checking if they have been correctly returned
+        #Getting the video frame and checking if it and the audio capture are still working
         try:
+            startTime = self.profiler.begin()
             ret, frame = self.captureDevice.read()
-            if self.audioCaptureDevice is None or self.audioStream is None:
-                return None, None
-            audioData = self.audioStream.read(1024)
+            timestamp = self.frameTimestamp()
+            self.profiler.end("capture", startTime)
         except OSError:
             self.audioError = True
             return None, "ReadError"
-        self.frameTimer -= 1
-        self.predictFrameWaitCounter -= 1
-        if not ret or audioData is None:
+        if self.audioCapture is None:
+            return None, None
+        if not self.audioCapture.isActive():
+            self.audioError = True
+            return None, "ReadError"
+        if not ret:
             return None, None
+        if self.sessionCapture is not None:
+            self.sessionCapture.addFrame(frame, timestamp, useAI)
         
-        #If the usage of AI is needed process the image
-        if useAI and self.frameTimer <= 0:
-            command, boundingBox = self.processFrame(frame)
-            self.frameTimer = self.frameTimeMax
-            #Check if new prediction should be processed or not
-            if self.predictFrameWaitCounter > 0:
-                command = None
-
-        #If there was a prediction handle it, after a couple of frames from the last detection
-        if command is not None:
-            #In order to bypass accidental detections, a number of detections are needed from the same hand gesture
-            if self.currentPrediction == command:
-                self.predictConfidenceCounter -= 1
-            else:
-                self.currentPrediction = command
-                self.predictConfidenceCounter = self.predictConfidenceCounterMax - 1
-
-            if self.predictConfidenceCounter <= 0:
-                self.processDrawCommands(command, boundingBox)
-                if command != "draw":
-                    self.predictFrameWaitCounter = self.predictFrameWaitCounterMax
-                    self.currentPrediction = None
+        #If the usage of AI is needed send the image to the model and use the newest prediction
+        command = self.applyInference(frame, timestamp, useAI)
         
         #Draw the line to the screen
         frame = self.drawLines(frame)
 
         #Flip the screen horizontally
-        frame = cv2.flip(frame, 1)
+        frame = self.flipFrame(frame)
 
         #If the frame was succesfully retrieved, save for the screenshot functionality
         self.lastVideoFrame = frame
 
-        #Store the volume controlled data in the audio buffer
-        chunk = numpy.fromstring(audioData, numpy.int16)
-        chunk = chunk * self.audioVolumeLevel
-        audioData = chunk.astype(numpy.int16)
-        self.audioFrames.append(audioData)
-
         #Write the video frame to the visual part of the video
         if self.videoWriter is None:
             return None, None
-        self.videoWriter.write(frame)
-
-        #FPS handling, if the fps is too low, the video should not be sped up
-        self.fpsTimeRemainder += max(time.time() - startTime - 1./self.videoFrameRate,0)
-        try:
-            self.dynamicFPSHandler(frame)
-        except OSError:
-            return None, "ReadError"
+        self.writeFrame(frame, timestamp)
 
         #Return the current frame
         return frame, command
+
+    def flipFrame(self, frame):
+        startTime = self.profiler.begin()
+        frame = cv2.flip(frame, 1)
+        self.profiler.end("flip", startTime)
+        return frame
+
+    def writeFrame(self, frame, timestamp):
+        startTime = self.profiler.begin()
+        if self.segmentSeconds > 0:
+            self.checkSegment(timestamp)
+        self.videoWriter.write(frame)
+        #FPS handling, if the fps is too low, the video should not be sped up
+        self.dynamicFPSHandler(frame, timestamp)
+        self.profiler.end("encode", startTime)
+        #The checksums of the output frames, for comparing the runs of a session
+        if self.sessionCapture is not None:
+            self.sessionCapture.addOutput(timestamp, frame)
+        if self.sessionReplay is not None:
+            self.sessionReplay.addOutput(timestamp, frame)
+        encoderQueue = getattr(self.videoWriter, "frameQueue", None)
+        if encoderQueue is not None:
+            self.profiler.gauge("encoderQueue", encoderQueue.depth())
     
-    def drawLines(self, frame):
-        #Draw lines to the screen
-        for i in range(1, len(self.drawPixel)):
-            #Check whether the next pair would be the same, if yes it's a new line
-            if i < len(self.drawPixel) - 1 and self.drawPixel[i] == self.drawPixel[i+1]:
-                continue
-            cv2.line(frame, self.drawPixel[i-1], self.drawPixel[i], (255, 255, 255), thickness=self.lineTickness)
+    def createSegment(self, index):
+        #The temp files are named after the recording, so they do not collide with the files of another recording
+        tempName = self.settings["savePath"] + "/Temp" + self.recordingName + "-" + "%03d" % index
+        return RecordingSegment(index, tempName + ".mp4", tempName + ".wav",
+                                self.settings["savePath"] + "/" + self.recordingName + "-Part" + "%03d" % index + ".mp4",
+                                FrameTimeline(self.videoFrameRate, self.settings.get("stallThreshold", 0.5)))
+
+    def checkSegment(self, timestamp):
+        #Moving on to a new segment before writing the frame, when the current one is long enough
+        segment = self.currentSegment
+        if segment.startTime is None:
+            segment.startTime = timestamp
+            return
+        if timestamp - segment.startTime < self.segmentSeconds:
+            return
+        #The audio is split by its capture time, so it can only be done after the first sample arrived
+        audioStartTime = self.audioCaptureTime(self.audioCapture.firstSampleTime)
+        if audioStartTime is None:
+            return
+        nextSegment = self.createSegment(segment.index + 1)
+        try:
+            videoWriter = createVideoEncoder(self.settings, nextSegment.videoPath, self.videoFrameRate, self.videoSize)
+        except Exception as e:
+            #The current segment goes on, the next one is tried after another segment length
+            print("Starting a new segment failed: ", e)
+            segment.startTime = timestamp
+            return
+        nextSegment.startTime = timestamp
+        #The audio of the new segment starts at the sample which was captured together with its first frame
+        splitSample = max(int(round((timestamp - audioStartTime) * self.audioFrameRate)), 0) * self.audioNumberOfChannels
+        self.audioWriter.splitAt(splitSample, nextSegment.audioPath, lambda sample: segment.closeAudio(sample, nextSegment))
+        segment.videoWriter = self.videoWriter
+        self.videoWriter = videoWriter
+        self.frameTimeline = nextSegment.timeline
+        self.currentSegment = nextSegment
+        self.segmentFinalizer.submit(segment, audioStartTime)
+        self.profiler.count("segments")
+
+    def loadModel(self):
+        #Starting the background loading of the model, nothing happens if it was already started
+        #A failed loading is tried again with a new loader, with the current settings
+        if self.modelLoader.state == "failed":
+            self.modelLoader = ModelLoader(lambda: self.settings, self.modelInputSize)
+        self.modelLoader.load()
+
+    def getModelStatus(self):
+        #The state, the progress and the timings of the model loading
+        return self.modelLoader.status()
+
+    def applyInference(self, frame, timestamp, useAI):
+        startTime = self.profiler.begin()
+        command = self.handleInference(frame, timestamp, useAI)
+        self.profiler.end("inferenceHandling", startTime)
+        if command is not None and self.sessionCapture is not None:
+            self.sessionCapture.addCommand(timestamp, command)
+        return command
+
+    def handleInference(self, frame, timestamp, useAI):
+        #The frames are only sent to the model when it finished loading, the recording does not wait for it
+        if self.inferenceNeedsModel:
+            if useAI:
+                self.modelLoader.load()
+            useAI = useAI and self.modelLoader.isReady()
+
+        #Following the fingertip on the frames between the detections, before the lines are drawn on the frame
+        trackedPoint = self.trackFingertip(frame, timestamp, useAI)
+        if trackedPoint is not None:
+            self.addDrawPoint(trackedPoint, timestamp)
+
+        #Every frameTimeMax-th frame is sent to the worker, a copy is needed since the lines are drawn on the frame
+        self.frameTimer -= 1
+        if useAI and self.frameTimer <= 0:
+            if self.shouldRunInference(frame, timestamp):
+                self.inferenceWorker.submit(frame.copy(), timestamp)
+            self.frameTimer = self.frameTimeMax
+            if self.fingertipTracker is not None and self.fingertipTracker.isActive():
+                self.frameTimer = max(self.frameTimeMax, self.trackerAnchorInterval)
+
+        #The newest finished prediction is applied to the current frame
+        result = self.inferenceWorker.takeResult(timestamp)
+        if result is not None and self.sessionCapture is not None:
+            self.sessionCapture.addInference(timestamp, result)
+        if result is None or not useAI:
+            return None
+        return self.handlePrediction(result.command, result.boundingBox, result.timestamp)
+
+    def shouldRunInference(self, frame, timestamp):
+        #While a gesture is being confirmed or drawn the model always runs, a gesture can be held still
+        if self.motionGate is None:
+            return True
+        if timestamp - self.lastPredictionTime <= self.predictConfidenceWindow or (self.fingertipTracker is not None and self.fingertipTracker.isActive()):
+            self.motionGate.reset()
+            return True
+        return self.motionGate.check(frame, timestamp)
+
+    def handlePrediction(self, command, boundingBox, timestamp):
+        #Check if new prediction should be processed or not, a couple of seconds after the last detected command
+        if command is None or timestamp < self.predictWaitUntil:
+            return None
 
+        #In order to bypass accidental detections, a number of detections are needed from the same hand gesture close to each other
+        if self.currentPrediction == command and timestamp - self.lastPredictionTime <= self.predictConfidenceWindow:
+            self.predictConfidenceCounter -= 1
+        else:
+            self.currentPrediction = command
+            self.predictConfidenceCounter = self.predictConfidenceCounterMax - 1
+        self.lastPredictionTime = timestamp
+
+        if self.predictConfidenceCounter <= 0:
+            self.processDrawCommands(command, boundingBox, timestamp)
+            if command != "draw":
+                if self.fingertipTracker is not None:
+                    self.fingertipTracker.stop()
+                self.predictWaitUntil = timestamp + self.predictWaitTime
+                self.currentPrediction = None
+        return command
+
+    def drawLines(self, frame):
+        #Draw lines to the screen, the lines are already on the overlay, which is updated when a point is added
+        startTime = self.profiler.begin()
+        frame = self.drawingOverlay.apply(frame)
+        self.profiler.end("overlay", startTime)
         return frame
     
-    def processDrawCommands(self, command, boundingBox):
-        #Check whether the last draw event was 2 seconds before, if yes, start a new line
-        if time.time() - self.lastDrawAppend > 2:
-            self.drawNewLine = True
+    def trackFingertip(self, frame, timestamp, useAI):
+        #Returns the tracked fingertip on the frame, or None if nothing is being drawn
+        if self.fingertipTracker is None:
+            return None
+        if not useAI:
+            self.fingertipTracker.stop()
+            return None
+        point = self.fingertipTracker.update(frame, timestamp)
+        #Small movements are only the noise of the tracking
+        if point is None or (self.drawPixel and abs(point[0] - self.drawPixel[-1][0]) + abs(point[1] - self.drawPixel[-1][1]) < 2):
+            return None
+        return point
 
+    def processDrawCommands(self, command, boundingBox, timestamp):
         #Process the commands
         if command == "draw":
-            self.drawPixel.append((int((boundingBox[1] + boundingBox[3])/2), int(boundingBox[0])))
-            self.lastDrawAppend = time.time()
-            #In order to start drawing a new line, we double the first point
-            if self.drawNewLine:
-                self.drawPixel.append((int((boundingBox[1] + boundingBox[3])/2), int(boundingBox[0])))
-                self.drawNewLine = False
+            point = (int((boundingBox[1] + boundingBox[3])/2), int(boundingBox[0]))
+            #The detection re-anchors the tracker, which moves the point to where the fingertip is on the current frame
+            if self.fingertipTracker is not None:
+                point = self.fingertipTracker.anchor(point, boundingBox, timestamp)
+            self.addDrawPoint(point, timestamp)
         elif command == "clear":
             print(self.drawPixel)
             self.drawPixel = []
+            self.drawingOverlay.clear()
+
+    def addDrawPoint(self, point, timestamp):
+        #Check whether the last draw event was 2 seconds before, if yes, start a new line
+        if timestamp - self.lastDrawAppend > 2:
+            self.drawNewLine = True
+
+        #A new line starts with a dot, otherwise the line continues from the last point
+        startPoint = point if self.drawNewLine or not self.drawPixel else self.drawPixel[-1]
+        self.drawPixel.append(point)
+        self.lastDrawAppend = timestamp
+        #In order to start drawing a new line, we double the first point
+        if self.drawNewLine:
+            self.drawPixel.append(point)
+            self.drawNewLine = False
+        self.drawingOverlay.addSegment(startPoint, point)
     
-    def dynamicFPSHandler(self, frame):
-        #This function is responsible for keeping track of the fps of the video, with the help of the time values from the getCurrentFrame function
-        while self.fpsTimeRemainder >= 1./self.videoFrameRate:
+    def dynamicFPSHandler(self, frame, timestamp):
+        #This function is responsible for keeping track of the fps of the video, with the capture time of the written frames
+        #The frames are not duplicated, the video is stretched to the real time when muxing, only a long stall is filled
+        repeats = self.frameTimeline.stampFrame(timestamp)
+        for _ in range(repeats):
             self.videoWriter.write(frame)
-            self.fpsTimeRemainder -= 1./self.videoFrameRate
-            audioData = self.audioStream.read(1024)
-            chunk = numpy.fromstring(audioData, numpy.int16)
-            chunk = chunk * self.audioVolumeLevel
-            audioData = chunk.astype(numpy.int16)
-            self.audioFrames.append(audioData)
-            self.frameRepeatedCounter +=1
-
-        #Dinamicly dial down the rate at which the AI model processes images in case of too much delay
-        if self.frameRepeatedCounter > 10:
-            self.frameRepeatedCounter = 0
-            if self.frameTimeMax < 5:
-                self.frameTimeMax +=1
+        if repeats:
+            self.profiler.count("repeatedFrames", repeats)
+
+        self.adjustFrameTimeMax(timestamp)
+
+    def adjustFrameTimeMax(self, timestamp):
+        #Dinamicly dial the rate at which the AI model processes images up or down, based on the fps and the latency of the model
+        self.inferenceScheduler.recordFrame(timestamp)
+        self.frameTimeMax = self.inferenceScheduler.update(timestamp)
+
+    def getSchedulerReport(self):
+        #The measurements and the decisions of the inference scheduler, None if there is no recording
+        if self.inferenceScheduler is None:
+            return None
+        return self.inferenceScheduler.report()
     
     def setAudioVolumeLevel(self, audioLevel):
         #The function is given an audioLevel parameter, float between 0 and 1.0 and sets it as the volume level
         self.audioVolumeLevel = audioLevel
+        if self.audioWriter is not None:
+            self.audioWriter.volumeLevel = audioLevel
     
-    def processFrame(self, frame):
-        #Adding batch layer and resize image
-        inputArray = numpy.expand_dims(frame, 0)
-
-        #Running the detection
-        detections = self.model(inputArray)
-
-        # Formatting the detection
-        detectionBoxes = detections['detection_boxes'][0].numpy()
-        detectionClasses = detections['detection_classes'][0].numpy().astype(numpy.int32)
-        detectionScores = detections['detection_scores'][0].numpy()
-        returnClass = None
-        boundingBox = None
-
-        #Looping through the detections
-        for i in range(len(detectionBoxes)):
-            if detectionScores[i] >= self.predictTreshold:
-                #Get the name of the predicted class
-                for c in self.classes:
-                    if c['id'] == detectionClasses[i]:
-                        returnClass = c['name']
-                        break
-                yMin = int(detectionBoxes[i][0] * self.videoSize[1])
-                xMin = int(detectionBoxes[i][1] * self.videoSize[0])
-                yMax = int(detectionBoxes[i][2] * self.videoSize[1])
-                xMax = int(detectionBoxes[i][3] * self.videoSize[0])
-                boundingBox = [yMin, xMin, yMax, xMax]
+    def processFrame(self, frame, topK=None):
+        #Resizing the image into the reused input buffer, which already has the batch layer
+        startTime = self.profiler.begin()
+        inputArray = self.modelInput.prepare(frame)
+        self.profiler.end("inputPrepare", startTime)
+
+        #Running the detection, always with the same input shape, waiting for the model if it is still loading
+        inferenceBackend = self.modelLoader.wait()
+        if inferenceBackend is None:
+            return [] if topK is not None else (None, None)
+        startTime = self.profiler.begin()
+        detectionBoxes, detectionClasses, detectionScores = inferenceBackend.detect(inputArray)
+        self.profiler.end("inference", startTime)
+
+        #Decoding the detections above the threshold, if topK is given all of the best ones are returned with their scores
+        startTime = self.profiler.begin()
+        decoded = self.detectionDecoder.decode(detectionBoxes, detectionClasses, detectionScores, self.videoSize, topK or 1)
+        self.profiler.end("decode", startTime)
+        if topK is not None:
+            return decoded
+        if not decoded:
+            return None, None
+        returnClass, _, boundingBox = decoded[0]
         return returnClass, boundingBox
 
-    def stopRecorder(self):
-        #Releasing the visual recorder parts of the video
+    def stopRecorder(self, finalizationQueue=None):
+        #The devices are released at once, closing and merging the files is a FinalizationJob, which is returned
+        #With a FinalizationQueue the job runs in the background and the recorder can be started again immediately
+        #Letting the pipeline finish the frames which were already captured
+        self.stopPipeline()
+        self.inferenceWorker.stop()
+        self.profiler.setCounter("droppedInferenceFrames", self.inferenceWorker.droppedFrames())
+        self.profiler.setCounter("failedInferences", self.inferenceWorker.failedPredictions())
+        if self.inferenceWorker.failedPredictions():
+            print("Failed predictions: ", self.inferenceWorker.failedPredictions())
+        self.inferenceWorker = None
+
+        #Releasing the visual recorder parts of the video, the encoder is closed by the finalization
         self.captureDevice.release()
         self.captureDevice = None
-        self.videoWriter.release()
+        videoWriter = self.videoWriter
         self.videoWriter = None
-        self.fpsTimeRemainder = 0
         self.frameTimer = self.frameTimeMax
         self.drawPixel = []
-        self.predictFrameWaitCounter = self.predictFrameWaitCounterMax
+        self.drawingOverlay.clear()
+        #The capture clock starts again with the next recording
+        self.drawNewLine = True
+        self.lastDrawAppend = 0
+        if self.fingertipTracker is not None:
+            self.fingertipTracker.stop()
+        self.predictWaitUntil = 0
+        self.lastPredictionTime = 0
         self.currentPrediction = None
         self.predictConfidenceCounter = self.predictConfidenceCounterMax
     
         #Delete the last frame for the screenshot
         self.lastVideoFrame = None
 
-        #Saving to an audio file the frames which were accumulated
-        self.saveAudio()
-        self.audioFrames = []
-
         #Releasing the audio recorder parts of the video
-        if not self.audioError:
-            self.audioStream.stop_stream()
-        self.audioStream.close()
-        self.audioStream = None
-        self.audioCaptureDevice.terminate()
-        self.audioCaptureDevice = None
+        self.audioCapture.close()
         self.audioError = False
 
-        
-        #Merging the video and audio file to a single mp4
-        self.mergeAudioVideo()
+        #Writing out the rest of the audio and closing the file
+        self.saveAudio()
 
-        #Deleting the temp audio and video files
-        os.remove(self.settings["savePath"] + "/TempAudio.wav")
-        os.remove(self.settings["savePath"] + "/TempRecording.mp4")
+        #Calculating the timing of the output from the stamps of the frames and the audio, for the last segment
+        self.currentSegment.closeAudio(self.audioCapture.ringBuffer.readCounter)
+        self.syncReport = self.createSyncReport()
+        print("Synchronization report: ", self.syncReport)
+        print("Inference scheduler report: ", self.getSchedulerReport())
+        if self.motionGate is not None:
+            print("Motion gate report: ", self.motionGate.report())
+            self.profiler.setCounter("skippedInferences", self.motionGate.skippedInferences)
+        self.profiler.setCounter("droppedAudioSamples", self.audioCapture.ringBuffer.droppedSamples)
+        self.profiler.setCounter("audioOverflows", self.audioCapture.overflowCounter)
+        job = self.createFinalizationJob(videoWriter, self.audioCaptureTime(self.audioCapture.firstSampleTime))
+        self.sessionCapture = None
+        self.audioCapture = None
+        self.frameTimeline = None
+        self.currentSegment = None
+        self.segmentFinalizer = None
+
+        if finalizationQueue is None:
+            job.run()
+        else:
+            finalizationQueue.submit(job)
+        return job
+
+    def createFinalizationJob(self, videoWriter, audioStartTime):
+        #The steps only use the objects of this recording, so they can run while the next recording goes on
+        ffmpegPath = getFFmpegPath(self.settings)
+        videoFileName = self.videoFileName
+        segment = self.currentSegment
+        segmentFinalizer = self.segmentFinalizer
+        sessionCapture = self.sessionCapture
+        sessionArguments = (audioStartTime, self.audioFrameRate, self.audioNumberOfChannels, self.syncReport)
+
+        steps = [("Closing the video", videoWriter.release)]
+        if self.profiler.enabled:
+            #The measurements are copied, the profiler is reset when the next recording starts
+            profiler = self.profiler.snapshot()
+            basePath = self.settings.get("instrumentationPath") or self.settings["savePath"]
+            basePath = os.path.join(basePath, os.path.splitext(os.path.basename(videoFileName))[0])
+            steps.append(("Exporting the instrumentation", lambda: self.exportInstrumentation(profiler, basePath)))
+        if sessionCapture is not None:
+            def saveSession():
+                sessionCapture.close(*sessionArguments)
+                print("Session saved to: ", sessionCapture.path)
+            steps.append(("Saving the session", saveSession))
+        #Merging the video and audio file to a single mp4
+        steps.append(("Merging the audio and video", lambda: mergeSegments(ffmpegPath, segment, segmentFinalizer, videoFileName)))
+        return FinalizationJob(os.path.basename(videoFileName), steps)
 
+    def exportInstrumentation(self, profiler, basePath):
+        #Writing the statistics and the traces next to the recording, named after it, a failed export does not fail the job
+        try:
+            print("Instrumentation exported to: ", profiler.export(basePath))
+        except OSError as e:
+            print("Exporting the instrumentation failed: ", e)
 
     def saveAudio(self):
-        #Creating an audio file from the gotten audio input
-        wf = wave.open(self.settings["savePath"] + "/TempAudio.wav", 'wb')
-        wf.setnchannels(self.audioNumberOfChannels)
-        wf.setsampwidth(self.audioCaptureDevice.get_sample_size(pyaudio.paInt16))
-        wf.setframerate(self.audioFrameRate)
-        wf.writeframes(b''.join(self.audioFrames))
-        wf.close()
-
-    def mergeAudioVideo(self):
-        #Create the paths of the audio and video files
-        audioPath = self.settings["savePath"] + "/TempAudio.wav"
-        videoPath = self.settings["savePath"] + "/TempRecording.mp4"
-
-        #Create instances of VideoFileClip and AudioFileClip
-        videoEditor = VideoFileClip(videoPath)
-        audioEditor = AudioFileClip(audioPath)
-
-        #Merge the audio and video clips
-        fullVideo = videoEditor.set_audio(audioEditor)
-
-        #Write the merged video file to the saved file
-        fullVideo.write_videofile(self.videoFileName)
+        #The audio was written to the file during the recording, only the remaining buffers need to be flushed
+        self.audioWriter.close()
+        self.audioWriter = None
+
+    def createSyncReport(self):
+        #Drift statistics and the corrections for the muxer of the last segment, the audio times are moved to the capture clock
+        audioStartTime = self.audioCaptureTime(self.audioCapture.firstSampleTime)
+        audioEndTime = self.audioCaptureTime(self.audioCapture.lastCallbackTime)
+        return self.currentSegment.createSyncReport(audioStartTime, self.audioFrameRate, self.audioNumberOfChannels,
+                                                    audioEndTime, self.audioCapture.ringBuffer.droppedSamples)
+
+    def audioCaptureTime(self, audioTime):
+        #Moving a monotonic time of the audio source to the capture clock, the replayed audio is already on it
+        if audioTime is None or getattr(self.audioCapture, "usesCaptureClock", False):
+            return audioTime
+        return self.captureClock.toClock(audioTime)
 
     def takeScreenshot(self):
         #Check if there is a last frame stored, meaning a video is running
@@ -0,0 +1,168 @@
+import json
+import socketserver
+import threading
+
+from VideoRecorder.Recorder import Recorder
+
+class RecorderDaemon:
+    #The messages of the start errors, the same as on the main page
+    errorMessages = {
+        1: "Invalid camera settings, recording cannot be started!",
+        2: "No video path found, cannot start recording!",
+        3: "Invalid audio settings recording cannot be started!",
+        4: "Video or Audio input error!",
+    }
+
+    def __init__(self, settings):
+        #Drives the Recorder directly, without the ui and without converting the frames for a preview
+        self.settings = settings
+        self.recorder = Recorder(settings)
+        self.recordingThread = None
+        self.stopped = True
+        self.aiSupport = False
+        self.lastError = ""
+        self.lock = threading.Lock()
+
+        #Volume handling, the same as the slider on the main page
+        self.maxVolume = 100
+        self.lastVolume = self.maxVolume
+        self.currentVolume = self.maxVolume
+        self.gestureCounter = 0
+
+    def startRecording(self):
+        with self.lock:
+            if self.recordingThread is not None:
+                return "ERROR already recording"
+            returnValue = self.recorder.startRecorder()
+            if returnValue != 0:
+                self.lastError = self.errorMessages[returnValue]
+                return "ERROR " + self.lastError
+            self.lastError = ""
+            self.stopped = False
+            self.recordingThread = threading.Thread(target=self.recordingLoop, name="HeadlessRecorder", daemon=True)
+            self.recordingThread.start()
+            return "OK recording to " + self.recorder.videoFileName
+
+    def stopRecording(self):
+        with self.lock:
+            if self.recordingThread is None:
+                return "ERROR not recording"
+            self.stopped = True
+            self.recordingThread.join()
+            self.recordingThread = None
+            #Without a finalization queue the job is already finished here
+            job = self.recorder.stopRecorder()
+            if job.state == "failed":
+                self.lastError = "Saving " + self.recorder.videoFileName + " failed: " + (job.status()["error"] or "the temp files are kept")
+                return "ERROR " + self.lastError
+            return "OK saved " + self.recorder.videoFileName
+
+    def recordingLoop(self):
+        #Getting the frames as fast as the recorder can, the frames themselves are not needed
+        while not self.stopped:
+            _, command = self.recorder.getCurrentFrame(self.aiSupport)
+            if command == "ReadError":
+                self.lastError = self.errorMessages[4]
+                self.stopped = True
+                #The recording is finished from a separate thread, since stopping waits for this one
+                threading.Thread(target=self.stopRecording, daemon=True).start()
+                return
+            self.handleGesture(command)
+
+    def handleGesture(self, command):
+        if command not in ("mute", "voicedown", "voiceup"):
+            return
+        #Every command is reported twice by the debouncing of the recorder, so every second one is skipped like on the main page
+        self.gestureCounter += 1
+        if self.gestureCounter == 2:
+            self.gestureCounter = 0
+            return
+
+        if command == "mute":
+            if self.currentVolume != 0:
+                self.lastVolume = self.currentVolume
+                self.setVolume(0)
+            else:
+                self.setVolume(self.lastVolume)
+        else:
+            levelChange = -5 if command == "voicedown" else 5
+            if 0 <= self.currentVolume + levelChange <= self.maxVolume:
+                self.setVolume(self.currentVolume + levelChange)
+
+    def setVolume(self, level):
+        self.currentVolume = level
+        self.recorder.setAudioVolumeLevel(level/100.0)
+
+    def takeScreenshot(self):
+        if self.recordingThread is None:
+            return "ERROR not recording"
+        if self.recorder.takeScreenshot() is None:
+            return "ERROR invalid screenshot path"
+        return "OK screenshot taken"
+
+    def status(self):
+        state = "recording" if self.recordingThread is not None else "idle"
+        return "OK " + state + " volume=" + str(self.currentVolume) + " ai=" + ("on" if self.aiSupport else "off") + " model=" + self.recorder.getModelStatus()["state"] + (" error=" + self.lastError if self.lastError else "")
+
+    def handleRequest(self, line):
+        #Text commands, one per line: start, stop, screenshot, volume <0-100>, ai <on|off>, status, scheduler
+        parts = line.strip().split()
+        if not parts:
+            return "ERROR empty command"
+        command = parts[0].lower()
+        if command == "start":
+            return self.startRecording()
+        if command == "stop":
+            return self.stopRecording()
+        if command == "screenshot":
+            return self.takeScreenshot()
+        if command == "status":
+            return self.status()
+        if command == "scheduler":
+            #The report stays available after the recording stopped, until the next one starts
+            report = self.recorder.getSchedulerReport()
+            if report is None:
+                return "ERROR no recording yet"
+            return "OK " + json.dumps(report)
+        if command == "volume":
+            try:
+                level = int(parts[1])
+            except (IndexError, ValueError):
+                return "ERROR usage: volume <0-100>"
+            if not 0 <= level <= self.maxVolume:
+                return "ERROR usage: volume <0-100>"
+            self.setVolume(level)
+            return "OK volume=" + str(level)
+        if command == "ai":
+            if len(parts) < 2 or parts[1].lower() not in ("on", "off"):
+                return "ERROR usage: ai <on|off>"
+            self.aiSupport = parts[1].lower() == "on"
+            if self.aiSupport:
+                self.recorder.loadModel()
+            return "OK ai=" + parts[1].lower()
+        return "ERROR unknown command " + command
+
+    def serve(self, host="127.0.0.1", port=5005):
+        #Local socket server, every connection can send any number of commands and gets one answer line for each
+        daemon = self
+
+        class CommandHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.decode(errors="replace")
+                    if line.strip().lower() == "quit":
+                        break
+                    self.wfile.write((daemon.handleRequest(line) + "\n").encode())
+
+        class CommandServer(socketserver.ThreadingTCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        with CommandServer((host, port), CommandHandler) as server:
+            print("Headless recorder listening on", host + ":" + str(port))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        if self.recordingThread is not None:
+            self.stopRecording()
@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+
+from VideoRecorder.FFmpegTools import concatenateVideos, remuxAudioVideo
+
+class RecordingSegment:
+    def __init__(self, index, videoPath, audioPath, outputPath, timeline):
+        #A part of the recording with its own video and audio file, muxed into a self contained mp4 when it is finished
+        self.index = index
+        self.videoPath = videoPath
+        self.audioPath = audioPath
+        self.outputPath = outputPath
+        self.timeline = timeline
+        #The encoder of the segment after the recording moved on to the next segment, released by the finalizer
+        self.videoWriter = None
+        #The capture time of the first frame of the segment
+        self.startTime = None
+        #The audio samples of the segment counted from the start of the recording, with the channels interleaved
+        self.audioStartSample = 0
+        self.audioEndSample = None
+        self.audioClosed = threading.Event()
+        self.syncReport = None
+
+    def closeAudio(self, endSample, nextSegment=None):
+        #Called by the audio writer when the wav file of the segment is closed, the next segment starts at the same sample
+        self.audioEndSample = endSample
+        if nextSegment is not None:
+            nextSegment.audioStartSample = endSample
+        self.audioClosed.set()
+
+    def createSyncReport(self, audioStartTime, audioFrameRate, channels, audioEndTime=None, droppedAudioSamples=0):
+        #The timing corrections of the segment, audioStartTime is the first sample of the whole recording on the capture clock
+        segmentAudioStartTime = None
+        if audioStartTime is not None:
+            segmentAudioStartTime = audioStartTime + self.audioStartSample // channels / float(audioFrameRate)
+        self.syncReport = self.timeline.report(segmentAudioStartTime, audioEndTime,
+                                               (self.audioEndSample - self.audioStartSample) // channels,
+                                               audioFrameRate, droppedAudioSamples)
+        return self.syncReport
+
+    def mux(self, ffmpegPath, outputPath=None):
+        #Muxing the video and the audio of the segment, the temp files are only deleted if it succeeded
+        if not remuxAudioVideo(ffmpegPath, self.videoPath, self.audioPath, outputPath or self.outputPath,
+                               videoScale=self.syncReport["videoScale"], audioOffset=self.syncReport["audioOffset"]):
+            return False
+        os.remove(self.audioPath)
+        os.remove(self.videoPath)
+        return True
+
+class SegmentFinalizer(threading.Thread):
+    def __init__(self, ffmpegPath, audioFrameRate, channels):
+        super().__init__(name="SegmentFinalizer", daemon=True)
+        #The finished segments are muxed in the order of the recording, while the recording goes on
+        self.ffmpegPath = ffmpegPath
+        self.audioFrameRate = audioFrameRate
+        self.channels = channels
+        self.segments = queue.Queue()
+        self.finishedPaths = []
+        self.failedSegments = []
+
+    def submit(self, segment, audioStartTime):
+        self.segments.put((segment, audioStartTime))
+
+    def run(self):
+        while True:
+            item = self.segments.get()
+            if item is None:
+                return
+            segment, audioStartTime = item
+            #The encoder is released here, so the recording does not wait for the end of the file to be written
+            try:
+                segment.videoWriter.release()
+            except OSError as e:
+                print("Closing the video of segment", segment.index, "failed: ", e)
+                self.failedSegments.append(segment)
+                continue
+            finally:
+                segment.videoWriter = None
+            segment.audioClosed.wait()
+            print("Segment", segment.index, "synchronization report: ",
+                  segment.createSyncReport(audioStartTime, self.audioFrameRate, self.channels))
+            if segment.mux(self.ffmpegPath):
+                self.finishedPaths.append(segment.outputPath)
+            else:
+                self.failedSegments.append(segment)
+
+    def close(self):
+        #Waiting for the segments which are already submitted
+        self.segments.put(None)
+        self.join()
+
+def mergeSegments(ffmpegPath, segment, segmentFinalizer, outputPath):
+    #Muxing the last segment and joining it to the earlier ones, a recording with a single segment is muxed straight into outputPath
+    #If anything failed the temp files and the segments are kept, so the recording is not lost
+    merged = segment.mux(ffmpegPath, outputPath if segment.index == 0 else None)
+    if segmentFinalizer is None:
+        return merged
+    #The earlier segments were muxed during the recording, at most the one before the last can still be running
+    segmentFinalizer.close()
+    if segment.index == 0:
+        return merged
+    if not merged or segmentFinalizer.failedSegments:
+        print("The segments are kept next to: ", outputPath)
+        return False
+    #Joining the segments by copying the streams, so it does not depend on the encoding of the video
+    segmentPaths = segmentFinalizer.finishedPaths + [segment.outputPath]
+    if not concatenateVideos(ffmpegPath, segmentPaths, outputPath):
+        return False
+    for path in segmentPaths:
+        os.remove(path)
+    return True
@@ -0,0 +1,255 @@
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from array import array
+
+import cv2
+import numpy
+
+from VideoRecorder.CaptureSources import GeneratedAudioSource, WavAudioSource
+from VideoRecorder.FFmpegTools import getFFmpegPath
+from VideoRecorder.InferenceWorker import InferenceResult
+from VideoRecorder.VideoEncoders import FFmpegPipeEncoder
+
+#A session archive is a folder with the raw inputs of a recording and what the recorder did with them:
+#input.mp4 - the camera frames before anything is drawn on them
+#audio.wav - the microphone audio before the volume is applied
+#timeline.npz - the capture time of every frame, whether the AI was on and the checksum of every output frame
+#session.json - the settings of the recording, the model outputs and the commands, with the capture time of the frames
+
+def frameChecksum(frame):
+    #Cheap checksum of an output frame, for comparing two runs frame by frame
+    return zlib.crc32(numpy.ascontiguousarray(frame).data)
+
+class SessionCapture:
+    def __init__(self, path, frameRate, frameSize, settings):
+        #Saving the inputs and the outputs of a live recording into an archive folder
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.frameRate = frameRate
+        self.frameSize = frameSize
+        self.settings = settings
+        self.audioPath = os.path.join(path, "audio.wav")
+        #Nearly lossless, the replay decodes the same frames every time
+        self.videoWriter = FFmpegPipeEncoder(os.path.join(path, "input.mp4"), frameRate, frameSize, getFFmpegPath(settings),
+                                             "libx264", "veryfast", settings.get("sessionCaptureCrf", 12))
+        self.lock = threading.Lock()
+        self.frameTimestamps = array('d')
+        self.frameUseAI = array('b')
+        self.outputTimestamps = array('d')
+        self.outputChecksums = array('q')
+        self.inferences = []
+        self.commands = []
+
+    def addFrame(self, frame, timestamp, useAI):
+        #The encoder only queues the frame, a copy is needed since the recorder draws the lines on it in place
+        self.videoWriter.write(frame.copy())
+        self.frameTimestamps.append(timestamp)
+        self.frameUseAI.append(bool(useAI))
+
+    def addInference(self, frameTimestamp, result):
+        #The result was applied to the frame captured at frameTimestamp, it was predicted on the frame captured at result.timestamp
+        with self.lock:
+            self.inferences.append({"frameTimestamp": frameTimestamp, "timestamp": result.timestamp, "command": result.command,
+                                    "boundingBox": None if result.boundingBox is None else [float(value) for value in result.boundingBox]})
+
+    def addCommand(self, frameTimestamp, command):
+        with self.lock:
+            self.commands.append({"frameTimestamp": frameTimestamp, "command": command})
+
+    def addOutput(self, timestamp, frame):
+        self.outputTimestamps.append(timestamp)
+        self.outputChecksums.append(frameChecksum(frame))
+
+    def close(self, audioStartTime, audioFrameRate, audioChannels, syncReport):
+        self.videoWriter.release()
+        numpy.savez_compressed(os.path.join(self.path, "timeline.npz"),
+                               frameTimestamps=numpy.frombuffer(self.frameTimestamps, dtype=numpy.float64),
+                               frameUseAI=numpy.frombuffer(self.frameUseAI, dtype=numpy.int8).astype(bool),
+                               outputTimestamps=numpy.frombuffer(self.outputTimestamps, dtype=numpy.float64),
+                               outputChecksums=numpy.frombuffer(self.outputChecksums, dtype=numpy.int64))
+        metadata = {"frameRate": self.frameRate, "frameSize": list(self.frameSize), "frameCount": len(self.frameTimestamps),
+                    "audioStartTime": audioStartTime, "audioFrameRate": audioFrameRate, "audioChannels": audioChannels,
+                    "settings": self.settings, "syncReport": syncReport,
+                    "inferences": self.inferences, "commands": self.commands}
+        with open(os.path.join(self.path, "session.json"), "w") as outfile:
+            json.dump(metadata, outfile)
+
+    def discard(self):
+        #Stopping the encoder and removing the folder, when the recording could not be started
+        try:
+            self.videoWriter.release()
+        except OSError:
+            pass
+        shutil.rmtree(self.path, ignore_errors=True)
+
+class SessionArchive:
+    def __init__(self, path):
+        #Reading an archive written by SessionCapture
+        self.path = path
+        with open(os.path.join(path, "session.json")) as infile:
+            self.metadata = json.load(infile)
+        timeline = numpy.load(os.path.join(path, "timeline.npz"))
+        self.frameTimestamps = timeline["frameTimestamps"]
+        self.frameUseAI = timeline["frameUseAI"]
+        self.outputTimestamps = timeline["outputTimestamps"]
+        self.outputChecksums = timeline["outputChecksums"]
+        self.videoPath = os.path.join(path, "input.mp4")
+        self.audioPath = os.path.join(path, "audio.wav")
+
+class ReplayClock:
+    def __init__(self):
+        #The capture time of the newest replayed frame, the audio of the replay follows it
+        self.time = 0.0
+        self.finished = False
+
+class SessionVideoSource:
+    #The frames carry their recorded capture time, the recorder uses it instead of its own clock
+    providesTimestamps = True
+
+    def __init__(self, archive, clock, paced=False):
+        #Replaying the frames of the archive, paced by the recorded capture times or as fast as they are read
+        self.archive = archive
+        self.clock = clock
+        self.paced = paced
+        self.capture = cv2.VideoCapture(archive.videoPath)
+        if not self.capture.isOpened():
+            raise ValueError("Cannot open the session video: " + archive.videoPath)
+        self.frameIndex = 0
+        self.lastTimestamp = 0.0
+        self.startTime = None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def get(self, propertyId):
+        properties = {cv2.CAP_PROP_FPS: self.archive.metadata["frameRate"],
+                      cv2.CAP_PROP_FRAME_WIDTH: self.archive.metadata["frameSize"][0],
+                      cv2.CAP_PROP_FRAME_HEIGHT: self.archive.metadata["frameSize"][1]}
+        return properties.get(propertyId, 0)
+
+    def nextUseAI(self):
+        #Whether the AI was turned on for the next frame in the recorded session
+        if self.frameIndex >= len(self.archive.frameUseAI):
+            return False
+        return bool(self.archive.frameUseAI[self.frameIndex])
+
+    def read(self):
+        if self.frameIndex >= len(self.archive.frameTimestamps):
+            self.clock.finished = True
+            return False, None
+        ret, frame = self.capture.read()
+        if not ret:
+            self.clock.finished = True
+            return False, None
+        timestamp = float(self.archive.frameTimestamps[self.frameIndex])
+        if self.paced:
+            if self.startTime is None:
+                self.startTime = time.monotonic() - timestamp
+            waitTime = self.startTime + timestamp - time.monotonic()
+            if waitTime > 0:
+                time.sleep(waitTime)
+        self.frameIndex += 1
+        self.lastTimestamp = timestamp
+        self.clock.time = timestamp
+        return True, frame
+
+    def release(self):
+        self.capture.release()
+
+class SessionAudioSource(GeneratedAudioSource):
+    #The times of the audio are already on the capture clock of the replay
+    usesCaptureClock = True
+
+    def __init__(self, archive, clock, channels, bufferSeconds=4.0, chunkSize=1024):
+        #Feeding the recorded audio as far as the replayed frames have got, so the audio keeps up with an unpaced replay
+        self.wavSource = WavAudioSource(archive.audioPath, channels, loop=False, bufferSeconds=bufferSeconds, chunkSize=chunkSize)
+        super().__init__(self.wavSource.frameRate, channels, bufferSeconds, chunkSize)
+        self.clock = clock
+        self.startTime = archive.metadata["audioStartTime"] or 0.0
+        self.generatedFrames = 0
+
+    def generate(self, frameCount):
+        return self.wavSource.generate(frameCount)
+
+    def run(self):
+        if self.firstSampleTime is None:
+            self.firstSampleTime = self.startTime
+        #A chunk is written when the video has reached its end time, while the writer keeps the ring buffer from filling up
+        while not self.stopEvent.is_set():
+            endTime = self.startTime + (self.generatedFrames + self.chunkSize) / float(self.frameRate)
+            ringSpace = self.ringBuffer.capacity - self.ringBuffer.available()
+            if (endTime > self.clock.time and not self.clock.finished) or ringSpace < self.chunkSize * self.channels:
+                time.sleep(0.001)
+                continue
+            samples = self.generate(self.chunkSize)
+            if samples is None or len(samples) == 0:
+                break
+            self.generatedFrames += len(samples) // self.channels
+            self.capturedFrames = self.generatedFrames
+            self.lastCallbackTime = self.startTime + self.generatedFrames / float(self.frameRate)
+            self.ringBuffer.write(samples)
+        #Staying active until the recorder stops, the end of the audio is not a device error
+        self.stopEvent.wait()
+
+    def isActive(self):
+        return self.thread is not None
+
+class RecordedInferenceWorker:
+    def __init__(self, archive):
+        #Gives back the model outputs of the recorded session on the same frames, so the replay does not depend on the model speed
+        self.results = {}
+        for inference in archive.metadata["inferences"]:
+            self.results[inference["frameTimestamp"]] = InferenceResult(inference["command"], inference["boundingBox"], inference["timestamp"])
+        self.inferenceCounter = 0
+
+    def start(self):
+        pass
+
+    def submit(self, frame, timestamp):
+        pass
+
+    def takeResult(self, frameTimestamp=None):
+        result = self.results.get(frameTimestamp)
+        if result is not None:
+            self.inferenceCounter += 1
+        return result
+
+    def droppedFrames(self):
+        return 0
+
+    def failedPredictions(self):
+        return 0
+
+    def stop(self):
+        pass
+
+class SessionReplay:
+    def __init__(self, path, channels, bufferSeconds=4.0, paced=False, recordedInference=True):
+        #The sources and the inference worker of a replayed session, the output checksums are collected for the comparison
+        self.archive = SessionArchive(path)
+        self.clock = ReplayClock()
+        self.videoSource = SessionVideoSource(self.archive, self.clock, paced)
+        self.audioSource = SessionAudioSource(self.archive, self.clock, channels, bufferSeconds)
+        self.recordedInference = recordedInference
+        self.outputTimestamps = array('d')
+        self.outputChecksums = array('q')
+
+    def createInferenceWorker(self):
+        return RecordedInferenceWorker(self.archive) if self.recordedInference else None
+
+    def addOutput(self, timestamp, frame):
+        self.outputTimestamps.append(timestamp)
+        self.outputChecksums.append(frameChecksum(frame))
+
+    def isFinished(self):
+        return self.clock.finished
+
+def compareChecksums(timestamps, checksums, referenceTimestamps, referenceChecksums):
+    #Returns the capture times of the output frames which differ from the reference, or are missing from one of the runs
+    reference = dict(zip(numpy.asarray(referenceTimestamps).tolist(), numpy.asarray(referenceChecksums).tolist()))
+    current = dict(zip(numpy.asarray(timestamps).tolist(), numpy.asarray(checksums).tolist()))
+    return sorted(timestamp for timestamp in set(reference) | set(current) if reference.get(timestamp) != current.get(timestamp))
@@ -0,0 +1,82 @@
+import time
+from array import array
+
+import numpy
+
+class CaptureClock:
+    def __init__(self):
+        #Monotonic clock shared by the video and the audio capture, in seconds from the start of the recording
+        self.startTime = time.monotonic()
+
+    def now(self):
+        return time.monotonic() - self.startTime
+
+    def toClock(self, monotonicTime):
+        return monotonicTime - self.startTime
+
+class FrameTimeline:
+    def __init__(self, nominalFrameRate, stallThreshold=0.5):
+        #Every written frame is stamped with its capture time, the frames are written once and the timing is fixed when muxing
+        #Only a stall longer than stallThreshold seconds is filled by repeating the frame, so the video keeps in sync around it
+        self.nominalFrameRate = nominalFrameRate
+        self.stallThreshold = stallThreshold
+        self.averageInterval = 1./nominalFrameRate
+        self.lastInterval = 0
+        self.timestamps = array('d')
+        self.writtenIndexes = array('q')
+        self.writtenFrames = 0
+        self.repeatedFrames = 0
+
+    def stampFrame(self, timestamp):
+        #Returns how many extra times the frame has to be written
+        repeats = 0
+        if self.timestamps:
+            self.lastInterval = timestamp - self.timestamps[-1]
+            if self.lastInterval > self.stallThreshold:
+                repeats = max(int(round(self.lastInterval / self.averageInterval)) - 1, 0)
+            else:
+                self.averageInterval = 0.95 * self.averageInterval + 0.05 * self.lastInterval
+        self.timestamps.append(timestamp)
+        self.writtenIndexes.append(self.writtenFrames + repeats)
+        self.writtenFrames += 1 + repeats
+        self.repeatedFrames += repeats
+        return repeats
+
+    def report(self, audioStartTime=None, audioEndTime=None, audioSamples=0, audioFrameRate=0, droppedAudioSamples=0):
+        #Calculating the timing corrections for the muxer and the drift statistics of the recording
+        if len(self.timestamps) < 2:
+            return {"frames": len(self.timestamps), "videoScale": 1.0, "audioOffset": 0.0}
+        timestamps = numpy.frombuffer(self.timestamps, dtype=numpy.float64)
+        writtenIndexes = numpy.frombuffer(self.writtenIndexes, dtype=numpy.int64)
+        firstTime = float(timestamps[0])
+
+        #The real length of the video, the encoded frames are stretched to it, the last frame lasts a usual frame interval
+        realDuration = float(timestamps[-1]) - firstTime + float(numpy.median(numpy.diff(timestamps)))
+        encodedDuration = self.writtenFrames / self.nominalFrameRate
+        frameDuration = realDuration / self.writtenFrames
+        #The difference between the capture time of the frames and their time in the output
+        videoDrift = timestamps - (firstTime + writtenIndexes * frameDuration)
+
+        report = {
+            "frames": len(timestamps),
+            "writtenFrames": self.writtenFrames,
+            "repeatedFrames": self.repeatedFrames,
+            "nominalFps": self.nominalFrameRate,
+            "measuredFps": len(timestamps) / realDuration,
+            "videoDuration": realDuration,
+            "videoScale": realDuration / encodedDuration,
+            "videoDriftMaxMs": float(numpy.abs(videoDrift).max() * 1000),
+            "videoDriftMeanMs": float(numpy.abs(videoDrift).mean() * 1000),
+            "audioOffset": 0.0,
+        }
+
+        if audioStartTime is not None and audioFrameRate > 0:
+            audioDuration = audioSamples / float(audioFrameRate)
+            report["audioOffset"] = audioStartTime - firstTime
+            report["audioDuration"] = audioDuration
+            report["audioVideoDurationDifferenceMs"] = (audioDuration - realDuration + report["audioOffset"]) * 1000
+            report["droppedAudioSamples"] = droppedAudioSamples
+            #Difference between the clock of the audio device and the capture clock, in parts per million
+            if audioEndTime is not None and audioEndTime > audioStartTime:
+                report["audioClockDriftPpm"] = (audioDuration / (audioEndTime - audioStartTime) - 1) * 1e6
+        return report
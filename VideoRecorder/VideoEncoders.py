@@ -0,0 +1,122 @@
+import subprocess
+import threading
+
+import cv2
+import numpy
+
+from VideoRecorder.FramePipeline import FrameQueue, PIPELINE_END
+from VideoRecorder.FFmpegTools import getFFmpegPath
+
+class OpenCVEncoder:
+    def __init__(self, path, frameRate, size, fourcc="mp4v"):
+        #The original encoder of the application, the OpenCV video writer
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), frameRate, size)
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+class FFmpegPipeEncoder:
+    #Codecs which can be chosen, with the name of the ffmpeg option which sets the speed of the encoding
+    presetOptions = {"libx264": "-preset", "libx265": "-preset", "libvpx-vp9": "-deadline"}
+    #The encoding options which were already tried on a frame, with the frame size
+    checkedOptions = set()
+
+    def __init__(self, path, frameRate, size, ffmpegPath, codec="libx264", preset="veryfast", crf=23, bitrate="", threads=0, queueSize=8):
+        if codec not in self.presetOptions:
+            raise ValueError("Unsupported ffmpeg codec: " + str(codec))
+
+        #The raw BGR frames are sent to the standard input of ffmpeg, the encoding runs in its own process
+        inputOptions = [ffmpegPath, "-y", "-loglevel", "error",
+                        "-f", "rawvideo", "-pix_fmt", "bgr24",
+                        "-s", str(size[0]) + "x" + str(size[1]), "-r", str(frameRate),
+                        "-i", "-"]
+        encodingOptions = ["-c:v", codec, "-pix_fmt", "yuv420p",
+                           self.presetOptions[codec], str(preset),
+                           "-threads", str(threads)]
+
+        #Rate control, either a constant quality or a target bitrate
+        if bitrate:
+            encodingOptions += ["-b:v", str(bitrate)]
+        else:
+            encodingOptions += ["-crf", str(crf)]
+            if codec == "libvpx-vp9":
+                encodingOptions += ["-b:v", "0"]
+        if codec == "libx265":
+            encodingOptions += ["-tag:v", "hvc1"]
+        self.checkOptions(inputOptions, encodingOptions, size)
+
+        self.process = subprocess.Popen(inputOptions + encodingOptions + [path], stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if self.process.poll() is not None:
+            raise OSError("ffmpeg exited at start: " + self.process.stderr.read().decode(errors="replace"))
+        #The errors of ffmpeg are collected on a thread, so a full pipe cannot stop the encoding
+        self.errorOutput = []
+        self.errorThread = threading.Thread(target=self.readErrors, name="FFmpegPipeErrors", daemon=True)
+        self.errorThread.start()
+        self.failed = False
+        #Writing to the pipe can block, so a separate thread does it and the caller only waits if the queue is full
+        self.frameQueue = FrameQueue(queueSize, "block")
+        self.writerThread = threading.Thread(target=self.writeFrames, name="FFmpegPipeWriter", daemon=True)
+        self.writerThread.start()
+
+    def checkOptions(self, inputOptions, encodingOptions, size):
+        #ffmpeg only opens the encoder at the first frame, so a wrong codec or preset is tried on a black frame first
+        #It is done once for every set of options, so a new segment does not wait for it
+        key = tuple(inputOptions + encodingOptions)
+        if key in self.checkedOptions:
+            return
+        result = subprocess.run(inputOptions + encodingOptions + ["-frames:v", "1", "-f", "null", "-"],
+                                input=bytes(size[0] * size[1] * 3), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise ValueError("The ffmpeg encoder cannot be used: " + result.stderr.decode(errors="replace"))
+        self.checkedOptions.add(key)
+
+    def readErrors(self):
+        for line in self.process.stderr:
+            self.errorOutput.append(line.decode(errors="replace"))
+
+    def write(self, frame):
+        self.frameQueue.put(frame)
+
+    def writeFrames(self):
+        while True:
+            frame = self.frameQueue.get()
+            if frame is PIPELINE_END:
+                break
+            try:
+                self.process.stdin.write(numpy.ascontiguousarray(frame).data)
+            except (BrokenPipeError, ValueError):
+                #ffmpeg has stopped, the rest of the frames are only taken from the queue, the error is raised by release
+                if not self.failed:
+                    print("The ffmpeg encoder stopped during the recording: ", "".join(self.errorOutput))
+                self.failed = True
+
+    def release(self):
+        #Sending the remaining frames, then closing the input so ffmpeg can finish the file
+        self.frameQueue.putEnd()
+        self.writerThread.join()
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        self.errorThread.join()
+        if self.process.returncode != 0:
+            raise OSError("ffmpeg failed with code " + str(self.process.returncode) + ": " + "".join(self.errorOutput))
+
+def createVideoEncoder(settings, path, frameRate, size):
+    #Choosing the video encoder based on the settings, the OpenCV writer is the default
+    backend = settings.get("encoderBackend", "opencv")
+    if backend == "opencv":
+        return OpenCVEncoder(path, frameRate, size)
+    if backend == "ffmpeg":
+        return FFmpegPipeEncoder(path, frameRate, size, getFFmpegPath(settings),
+                                 codec=settings.get("encoderCodec", "libx264"),
+                                 preset=settings.get("encoderPreset", "veryfast"),
+                                 crf=settings.get("encoderCrf", 23),
+                                 bitrate=settings.get("encoderBitrate", ""),
+                                 threads=settings.get("encoderThreads", 0))
+    raise ValueError("Unknown encoder backend: " + str(backend))
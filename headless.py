@@ -0,0 +1,34 @@
+import argparse
+import json
+import socket
+import sys
+
+#Headless entry point, without Qt and win32, for running the recorder on servers:
+#python headless.py serve --port 5005
+#python headless.py send start
+#python headless.py send ai on
+
+def sendCommand(host, port, command):
+    with socket.create_connection((host, port)) as connection:
+        connection.sendall((command + "\n").encode())
+        answer = connection.makefile().readline().strip()
+    print(answer)
+    return 0 if answer.startswith("OK") else 1
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless video recorder controlled over a local socket")
+    parser.add_argument("mode", choices=["serve", "send"])
+    parser.add_argument("command", nargs="*", help="The command to send: start, stop, screenshot, volume <0-100>, ai <on|off>, status, scheduler")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--settings", default="Configs/settings.json")
+    args = parser.parse_args()
+
+    if args.mode == "send":
+        sys.exit(sendCommand(args.host, args.port, " ".join(args.command)))
+
+    #The recorder is only imported when serving, so sending a command stays fast
+    from VideoRecorder.RecorderDaemon import RecorderDaemon
+    with open(args.settings) as fileHandler:
+        settings = json.load(fileHandler)
+    RecorderDaemon(settings).serve(args.host, args.port)